@@ -132,7 +132,8 @@ class TestPost:
             'Добавьте `text` для поиска модели административного сайта'
         )
 
-        assert 'pub_date' in admin_model.list_filter or 'created' in admin_model.list_filter, (
+        date_filters = (*admin_model.list_filter, admin_model.date_hierarchy)
+        assert 'pub_date' in date_filters or 'created' in date_filters, (
             f'Добавьте `pub_date` или `created` для фильтрации модели административного сайта'
         )
 
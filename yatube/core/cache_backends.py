@@ -0,0 +1,306 @@
+"""Кэш в файле SQLite (WAL), общий для всех воркеров одного сервера.
+
+В отличие от `LocMemCache`, у всех процессов одна копия данных, а
+`cache.clear()` и инвалидация видны сразу везде. Записи вытесняются по
+давности последнего чтения (LRU), когда превышен `MAX_ENTRIES` или
+суммарный размер значений `MAX_SIZE`. Целые числа хранятся без
+сериализации, поэтому `incr` выполняется одним UPDATE.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1, size = size + new.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1, size = size - old.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache'
+    ' BEGIN'
+    ' UPDATE cache_stats SET size = size - old.size + new.size;'
+    ' END',
+)
+
+
+class SQLiteCache(BaseCache):
+    # Время последнего чтения обновляется не чаще раза в секунду,
+    # чтобы горячие ключи не превращали каждое чтение в запись.
+    access_resolution = 1.0
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._location = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 2 ** 20))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    # Соединения
+
+    def _connection(self):
+        # После fork соединение родителя использовать нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._location,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = pid
+            self._ensure_schema(connection)
+        return self._local.connection
+
+    def _ensure_schema(self, connection):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with self._transaction(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self._schema_ready = True
+
+    @contextmanager
+    def _transaction(self, connection=None):
+        connection = connection or self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    # Сериализация
+
+    @staticmethod
+    def _dumps(value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _size(value):
+        return len(value) if isinstance(value, bytes) else 8
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    # Чтение
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        made = {self._key(key, version): key for key in keys}
+        now = time.time()
+        connection = self._connection()
+        rows = connection.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            'WHERE key IN (%s)' % ', '.join('?' * len(made)),
+            list(made),
+        ).fetchall()
+        found, expired, stale = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[made[key]] = self._loads(value)
+            if now - accessed > self.access_resolution:
+                stale.append(key)
+        if expired or stale:
+            with self._transaction(connection):
+                self._delete_expired(connection, expired, now)
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale],
+                )
+        return found
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    # Запись
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            value = self._dumps(value)
+            rows.append((
+                self._key(key, version), value, expires, now,
+                self._size(value),
+            ))
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT INTO cache (key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed, size = excluded.size',
+                rows,
+            )
+            self._cull(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        value = self._dumps(value)
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'INSERT INTO cache (key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed, size = excluded.size '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (
+                    key, value, self.get_backend_timeout(timeout), now,
+                    self._size(value), now,
+                ),
+            )
+            added = cursor.rowcount > 0
+            if added:
+                self._cull(connection, now)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now),
+            )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT typeof(value) FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            if row[0] != 'integer':
+                raise TypeError("Value of key '%s' is not an integer" % key)
+            connection.execute(
+                'UPDATE cache SET value = value + ?, accessed = ? '
+                'WHERE key = ?',
+                (delta, now, key),
+            )
+            value, = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок жизни потока, как у LocMemCache.
+        pass
+
+    # Вытеснение
+
+    def _delete_expired(self, connection, keys, now):
+        connection.executemany(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            [(key, now) for key in keys],
+        )
+
+    def _cull(self, connection, now):
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, size FROM cache_stats'
+            ).fetchone()
+            if entries <= self._max_entries and size <= self._max_size:
+                return
+            # Как и в LocMemCache, за раз удаляется доля 1/CULL_FREQUENCY.
+            batch = max(entries // max(self._cull_frequency, 1), 1)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (batch,),
+            )
@@ -0,0 +1,74 @@
+"""Персональные фрагменты общих закэшированных страниц.
+
+Тело страницы рендерится и кэшируется один раз для всех читателей, а
+на месте зависящих от пользователя кусков (шапка, кнопка подписки,
+форма комментария) оставляются метки. При каждом ответе метки
+заменяются дешёвыми фрагментами, отрендеренными для текущего запроса.
+
+Фрагмент регистрируется функцией `register` и вставляется в шаблон
+тегом `{% user_fragment 'имя' аргументы %}`. Вне кэшируемых страниц
+тег просто рендерит фрагмент на месте.
+"""
+import base64
+import json
+import re
+from contextlib import contextmanager
+
+from django.template.loader import render_to_string
+
+
+PLACEHOLDER = '<!--user-fragment:{}-->'
+PLACEHOLDER_RE = re.compile(rb'<!--user-fragment:([A-Za-z0-9_\-]+)-->')
+DEFER_ATTRIBUTE = '_defer_user_fragments'
+
+_registry = {}
+
+
+def register(name, template_name, context=None):
+    """Регистрирует фрагмент.
+
+    `context(request, *args)` возвращает контекст шаблона фрагмента.
+    """
+    _registry[name] = (template_name, context)
+
+
+@contextmanager
+def deferred(request):
+    """Внутри блока фрагменты заменяются метками."""
+    setattr(request, DEFER_ATTRIBUTE, True)
+    try:
+        yield
+    finally:
+        setattr(request, DEFER_ATTRIBUTE, False)
+
+
+def is_deferred(request):
+    return getattr(request, DEFER_ATTRIBUTE, False)
+
+
+def render(request, name, args):
+    template_name, context = _registry[name]
+    return render_to_string(
+        template_name,
+        context(request, *args) if context else {},
+        request=request,
+    )
+
+
+def placeholder(name, args):
+    payload = json.dumps([name, list(args)], separators=(',', ':'))
+    return PLACEHOLDER.format(
+        base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    )
+
+
+def stitch(request, content):
+    """Подставляет в байты страницы фрагменты для текущего запроса."""
+    def replace(match):
+        payload = match.group(1)
+        name, args = json.loads(
+            base64.urlsafe_b64decode(payload + b'=' * (-len(payload) % 4))
+        )
+        return render(request, name, args).encode()
+
+    return PLACEHOLDER_RE.sub(replace, content)
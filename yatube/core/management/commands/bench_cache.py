@@ -0,0 +1,77 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержки SQLiteCache и LocMemCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000)
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument(
+            '--value-size', type=int, default=20000,
+            help='Размер значения в байтах (по умолчанию ~ страница ленты)'
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            backends = (
+                ('LocMemCache', LocMemCache(
+                    'bench', {'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+                )),
+                ('SQLiteCache', SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'),
+                    {'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+                )),
+            )
+            self.stdout.write(
+                f'{"backend":<12} {"operation":<8} {"p50, мкс":>10} '
+                f'{"p99, мкс":>10} {"оп/с":>10}'
+            )
+            for name, cache in backends:
+                for operation, timings in self.run(cache, options).items():
+                    self.report(name, operation, timings)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, cache, options):
+        value = 'x' * options['value_size']
+        keys = [f'key{number}' for number in range(options['keys'])]
+        iterations = options['iterations']
+        cache.set_many({key: value for key in keys})
+        cache.set('counter', 0)
+        operations = {
+            'set': lambda key: cache.set(key, value),
+            'get': cache.get,
+            'get_miss': lambda key: cache.get(f'missing:{key}'),
+            'incr': lambda key: cache.incr('counter'),
+        }
+        results = {}
+        for operation, call in operations.items():
+            timings = []
+            for number in range(iterations):
+                key = keys[number % len(keys)]
+                started = time.perf_counter()
+                call(key)
+                timings.append(time.perf_counter() - started)
+            results[operation] = timings
+        return results
+
+    def report(self, name, operation, timings):
+        timings = sorted(timings)
+        p50 = statistics.median(timings) * 10 ** 6
+        p99 = timings[int(len(timings) * 0.99) - 1] * 10 ** 6
+        rate = len(timings) / sum(timings)
+        self.stdout.write(
+            f'{name:<12} {operation:<8} {p50:>10.1f} {p99:>10.1f} '
+            f'{rate:>10.0f}'
+        )
@@ -0,0 +1,148 @@
+import math
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import pragma_statements
+
+
+SCHEMA = (
+    'CREATE TABLE post ('
+    ' id INTEGER PRIMARY KEY,'
+    ' author_id INTEGER NOT NULL,'
+    ' text TEXT NOT NULL,'
+    ' pub_date REAL NOT NULL'
+    ')',
+    'CREATE INDEX post_author_date ON post (author_id, pub_date)',
+)
+READ = (
+    'SELECT id, text, pub_date FROM post WHERE author_id = ? '
+    'ORDER BY pub_date DESC LIMIT 10'
+)
+WRITE = 'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)'
+# Настройки Django по умолчанию: журнал отката, synchronous FULL,
+# ожидание блокировки 5 с и новое соединение на каждый запрос.
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def _connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for statement in pragma_statements(pragmas):
+        connection.execute(statement)
+    return connection
+
+
+def _worker(path, pragmas, persistent, authors, write_ratio, duration, seed):
+    """Чередует чтения и записи до истечения `duration` секунд."""
+    rng = random.Random(seed)
+    text = 'x' * 500
+    reads, writes, errors = [], [], 0
+    connection = _connect(path, pragmas) if persistent else None
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        author_id = rng.randrange(authors)
+        current = connection
+        try:
+            current = current or _connect(path, pragmas)
+            if rng.random() < write_ratio:
+                current.execute('BEGIN IMMEDIATE')
+                current.execute(WRITE, (author_id, text, time.time()))
+                current.execute('COMMIT')
+                writes.append(time.perf_counter() - started)
+            else:
+                current.execute(READ, (author_id,)).fetchall()
+                reads.append(time.perf_counter() - started)
+            if connection is None:
+                current.close()
+        except sqlite3.OperationalError:
+            errors += 1
+            if current is not None and current.in_transaction:
+                current.execute('ROLLBACK')
+    return reads, writes, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при смешанной нагрузке '
+        'с настройками по умолчанию и с SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5)
+        parser.add_argument('--write-ratio', type=float, default=0.1)
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--authors', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        profiles = (
+            ('по умолчанию', DEFAULT_PRAGMAS, False),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS, True),
+        )
+        self.stdout.write(
+            f'{"профиль":<16} {"оп/с":>8} {"чтений/с":>9} {"записей/с":>10} '
+            f'{"чтение p95, мс":>15} {"запись p95, мс":>15} '
+            f'{"ошибок":>7}'
+        )
+        try:
+            for number, (name, pragmas, persistent) in enumerate(profiles):
+                path = os.path.join(directory, f'bench{number}.sqlite3')
+                self.prepare(path, pragmas, options)
+                self.report(name, self.run(
+                    path, pragmas, persistent, options
+                ), options['duration'])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def prepare(self, path, pragmas, options):
+        rng = random.Random(0)
+        connection = _connect(path, pragmas)
+        connection.execute('BEGIN')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(WRITE, (
+            (rng.randrange(options['authors']), 'x' * 500, rng.random())
+            for _ in range(options['rows'])
+        ))
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run(self, path, pragmas, persistent, options):
+        workers = options['workers']
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(
+                    _worker, path, pragmas, persistent, options['authors'],
+                    options['write_ratio'], options['duration'], seed,
+                )
+                for seed in range(workers)
+            ]
+            results = [future.result() for future in futures]
+        reads = [timing for result in results for timing in result[0]]
+        writes = [timing for result in results for timing in result[1]]
+        return reads, writes, sum(result[2] for result in results)
+
+    def report(self, name, results, duration):
+        reads, writes, errors = results
+
+        def p95(timings):
+            # Ближайший ранг: statistics.quantiles нет в Python 3.7.
+            if not timings:
+                return 0
+            ordered = sorted(timings)
+            return ordered[math.ceil(len(ordered) * 0.95) - 1] * 1000
+
+        self.stdout.write(
+            f'{name:<16} {(len(reads) + len(writes)) / duration:>8.0f} '
+            f'{len(reads) / duration:>9.0f} {len(writes) / duration:>10.0f} '
+            f'{p95(reads):>15.2f} {p95(writes):>15.2f} {errors:>7}'
+        )
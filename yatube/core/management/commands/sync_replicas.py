@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import PRIMARY
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из DATABASE_REPLICAS'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_DATABASE_REPLICAS'
+            )
+        source = sqlite3.connect(settings.DATABASES[PRIMARY]['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                started = time.monotonic()
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    # Backup API даёт согласованный снимок даже во время
+                    # записи, а читатели реплики видят старую или новую
+                    # копию целиком.
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(
+                    f'{alias}: {time.monotonic() - started:.2f} с'
+                )
+        finally:
+            source.close()
@@ -0,0 +1,163 @@
+"""Кэш страниц с инвалидацией по тегам.
+
+Каждая закэшированная страница помечается тегами сущностей, от которых
+она зависит. Версии тегов хранятся в кэше и входят в префикс ключа
+страницы, поэтому изменение сущности сбрасывает ровно те страницы,
+которые её показывают, а старые копии просто дожидаются своего TTL.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import fragments
+from .replicas import reading_replica
+
+
+TAG_PREFIX = 'tag:'
+# Персональные фрагменты всех пользователей сразу: пакетный пересчёт
+# для всех сбрасывает один тег, а не тег каждого пользователя.
+VIEWERS = 'viewers'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; отсутствующие теги получают новую версию."""
+    keys = [f'{TAG_PREFIX}{tag}' for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _bump(tags):
+    version = _new_version()
+    cache.set_many(
+        {f'{TAG_PREFIX}{tag}': version for tag in tags}, timeout=None
+    )
+
+
+def invalidate(*tags):
+    """Сбрасывает все страницы, помеченные любым из тегов."""
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+    _bump(tags)
+    if transaction.get_connection().in_atomic_block:
+        # Повтор после коммита не даёт параллельному запросу
+        # закэшировать под новой версией ещё не записанные данные.
+        transaction.on_commit(lambda: _bump(tags))
+
+
+def cache_page_tagged(timeout, key_prefix, tags):
+    """Кэширует общее для всех пользователей тело страницы.
+
+    Ключ зависит от адреса и версий тегов страницы; `tags` получает
+    аргументы представления и возвращает список тегов. Персональные
+    фрагменты подставляются в тело при каждом ответе, поэтому гости и
+    авторизованные пользователи читают одну закэшированную копию.
+
+    Версии тегов служат и валидаторами условного GET: ETag строится из
+    них, а Last-Modified равен времени последнего изменения. Если
+    клиент уже видел эту версию, ответ 304 отдаётся до запросов к базе
+    и рендеринга. Персональные фрагменты в валидаторах представлены
+    тегом `viewer_tag` пользователя, который сбрасывает всё, что
+    меняет его фрагменты, и общим тегом `VIEWERS`.
+
+    Страница, собранная из реплики, могла не увидеть изменение, уже
+    сбросившее теги, поэтому валидаторов не получает: иначе клиент
+    подтверждал бы устаревшую копию ответами 304 и дальше. Это касается
+    и закэшированного тела из реплики, и ответа запроса к реплике.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_tags = tags(*args, **kwargs)
+            all_versions = tag_versions(
+                [*page_tags, *viewer_tags(request)]
+            )
+            versions = all_versions[:len(page_tags)]
+            etag = page_etag(request, all_versions)
+            last_modified = max(all_versions) // 10 ** 9
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                return response
+            key = page_key(key_prefix, request, versions)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type, validated = cached
+                response = HttpResponse(content_type=content_type)
+            else:
+                with fragments.deferred(request):
+                    response = view(request, *args, **kwargs)
+                if response.streaming:
+                    return response
+                content = response.content
+                validated = not reading_replica()
+                if response.status_code == 200:
+                    cache.set(
+                        key, (content, response['Content-Type'], validated),
+                        page_timeout(timeout),
+                    )
+            response.content = fragments.stitch(request, content)
+            if response.status_code == 200:
+                # Фрагменты собраны этим запросом и тоже могли отстать.
+                if validated and not reading_replica():
+                    response['ETag'] = etag
+                    response['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def viewer_tag(user_id):
+    """Тег персональных фрагментов страниц пользователя `user_id`."""
+    return f'viewer:{user_id}'
+
+
+def viewer_tags(request):
+    if request.user.is_authenticated:
+        return [viewer_tag(request.user.pk), VIEWERS]
+    return []
+
+
+def page_timeout(timeout):
+    # Страница из отстающей реплики могла не увидеть изменение, которое
+    # уже сбросило теги, и не должна пережить это отставание.
+    if reading_replica():
+        return min(timeout, settings.REPLICA_MAX_LAG)
+    return timeout
+
+
+def page_etag(request, versions):
+    # Фрагменты зависят от пользователя, а формы — от секрета CSRF,
+    # который меняется при входе: иначе 304 оставил бы в браузере
+    # форму комментария со старым токеном.
+    digest = hashlib.md5(':'.join([
+        request.get_full_path(), str(request.user.pk),
+        request.META.get('CSRF_COOKIE', ''), *map(str, versions),
+    ]).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def page_key(key_prefix, request, versions):
+    digest = hashlib.md5(':'.join(
+        [request.get_full_path(), *map(str, versions)]
+    ).encode()).hexdigest()
+    return f'page:{key_prefix}.{digest}'
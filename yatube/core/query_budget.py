@@ -0,0 +1,117 @@
+"""Бюджет SQL-запросов представлений.
+
+Представление объявляет, сколько запросов ему можно сделать за ответ,
+декоратором `@query_budget(n)`. `QueryBudgetMiddleware` считает
+запросы каждого ответа и ищет повторяющиеся запросы одной формы —
+признак N+1. Превышение бюджета и N+1 пишутся в лог, а в строгом
+режиме (`QUERY_BUDGET_STRICT`, включён в тестах) поднимают
+`QueryBudgetExceeded`, и тест, запросивший страницу, падает.
+
+Считается худший случай: промах кэша страниц и все персональные
+фрагменты. Разовую работу, которая заведомо делает много запросов
+(например, создание недостающей миниатюры), оборачивают в `exempt()`.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ATTRIBUTE = 'query_budget'
+# Списки параметров разной длины дают один и тот же запрос.
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+# Управление транзакциями запросом к данным не считается.
+TRANSACTION_RE = re.compile(
+    r'(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE
+)
+
+_exempt = ContextVar('query_budget_exempt', default=False)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(queries):
+    """Объявляет наибольшее число запросов к базе за один ответ."""
+    def decorator(view):
+        setattr(view, BUDGET_ATTRIBUTE, queries)
+        return view
+    return decorator
+
+
+@contextmanager
+def exempt():
+    """Запросы внутри блока не учитываются."""
+    token = _exempt.set(True)
+    try:
+        yield
+    finally:
+        _exempt.reset(token)
+
+
+def query_shape(sql):
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _exempt.get() and not TRANSACTION_RE.match(sql):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """Формы запросов, выполненные не меньше `threshold` раз."""
+        shapes = Counter(map(query_shape, self.queries))
+        return {
+            shape: count for shape, count in shapes.items()
+            if count >= threshold
+        }
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.strict = settings.QUERY_BUDGET_STRICT
+        self.repeats = settings.QUERY_BUDGET_REPEATS
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        response['X-Query-Count'] = len(counter.queries)
+        self.check(request, counter)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, BUDGET_ATTRIBUTE, None)
+
+    def check(self, request, counter):
+        problems = []
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and len(counter.queries) > budget:
+            problems.append(
+                f'{len(counter.queries)} запросов при бюджете {budget}'
+            )
+        for shape, count in counter.repeated(self.repeats).items():
+            problems.append(f'N+1: {count} раз {shape}')
+        if not problems:
+            return
+        message = f'{request.method} {request.path}: ' + '; '.join(problems)
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,89 @@
+"""Чтение из реплик базы.
+
+Представления, помеченные `@replica_reads`, на GET и HEAD читают из
+одной из баз `DATABASE_REPLICAS`, выбранной на весь запрос. Всё
+остальное, включая админку и команды управления, работает с основной
+базой. Запись всегда идёт в основную базу, и после первой записи
+запрос до конца читает оттуда же.
+
+Реплика отстаёт от основной базы не больше чем на `REPLICA_MAX_LAG`
+секунд. Поэтому ответ на запрос, который мог что-то записать (любой
+метод кроме GET и HEAD), ставит cookie на это время. Пока она есть,
+запросы браузера читают из основной базы, и автор видит свой пост
+сразу после редиректа. Страницы, собранные из реплики, кэш страниц
+хранит не дольше того же срока.
+
+Локально репликами служат копии файла основной базы: их пути задаёт
+переменная окружения `YATUBE_DATABASE_REPLICAS`, а обновляет
+`manage.py sync_replicas`.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+PRIMARY = 'default'
+ATTRIBUTE = 'replica_reads'
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_replica = ContextVar('replica', default=None)
+
+
+def replica_reads(view):
+    """Разрешает представлению читать из реплики."""
+    setattr(view, ATTRIBUTE, True)
+    return view
+
+
+def reading_replica():
+    """Читает ли текущий запрос из реплики."""
+    return _replica.get() is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Дальше запрос должен видеть то, что сам записал.
+        _replica.set(None)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _replica.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 500:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_MAX_LAG,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            getattr(view_func, ATTRIBUTE, False)
+            and request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            _replica.set(random.choice(settings.DATABASE_REPLICAS))
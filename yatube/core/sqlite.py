@@ -0,0 +1,31 @@
+"""Настройка соединений SQLite.
+
+Каждое новое соединение Django с базой SQLite получает PRAGMA из
+`SQLITE_PRAGMAS`; у отдельной базы в `DATABASES` их можно дополнить
+или переопределить ключом `PRAGMAS`. Вместе с `CONN_MAX_AGE` это
+превращает настройку в разовую работу на соединение, а не на запрос.
+
+По умолчанию включены WAL (читатели не ждут писателя), synchronous
+NORMAL (в WAL не теряет целостность, только последние транзакции при
+отключении питания), отображение файла в память, увеличенный кэш
+страниц, ожидание блокировки и временные таблицы в памяти.
+"""
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def connection_pragmas(settings_dict):
+    return {**settings.SQLITE_PRAGMAS, **settings_dict.get('PRAGMAS', {})}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик `connection_created`."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection_pragmas(connection.settings_dict)
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
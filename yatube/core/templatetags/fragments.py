@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core import fragments
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def user_fragment(context, name, *args):
+    request = context.get('request')
+    if request is not None and fragments.is_deferred(request):
+        return mark_safe(fragments.placeholder(name, args))
+    return mark_safe(fragments.render(request, name, args))
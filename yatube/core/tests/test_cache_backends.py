@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from ..cache_backends import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_get_set_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'два'}
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_shared_between_instances(self):
+        """Второй экземпляр (другой воркер) видит те же данные."""
+        other = self.make_cache()
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expiry_and_add(self):
+        """add не перезаписывает живой ключ, но занимает истёкший."""
+        self.assertTrue(self.cache.add('key', 'first', timeout=None))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.cache.set('key', 'old', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr атомарно меняет целое значение."""
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter'), 11)
+        self.assertEqual(self.cache.decr('counter', 5), 6)
+        self.assertEqual(self.make_cache().get('counter'), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction_by_entries(self):
+        """При переполнении вытесняются давно не читавшиеся ключи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        cache.access_resolution = 0
+        for key in 'abc':
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(set(cache.get_many('abcd')), {'a', 'c', 'd'})
+
+    def test_eviction_by_size(self):
+        """Суммарный размер значений не превышает MAX_SIZE."""
+        cache = self.make_cache(MAX_SIZE=4096)
+        for number in range(10):
+            cache.set(f'key{number}', b'x' * 1024)
+        stored = cache.get_many([f'key{number}' for number in range(10)])
+        self.assertLessEqual(len(stored), 3)
+        self.assertIn('key9', stored)
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from ..query_budget import (
+    QueryBudgetExceeded, QueryBudgetMiddleware, exempt, query_budget
+)
+
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    def run_view(self, view):
+        request = RequestFactory().get('/')
+        middleware = QueryBudgetMiddleware(lambda request: view(request))
+        middleware.process_view(request, view, (), {})
+        return middleware(request)
+
+    def test_budget_exceeded(self):
+        """Представление, превысившее бюджет, роняет тест."""
+        @query_budget(1)
+        def view(request):
+            User.objects.count()
+            User.objects.exists()
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.run_view(view)
+
+    def test_repeated_queries_detected(self):
+        """Одинаковые запросы в цикле считаются N+1."""
+        users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(3)
+        ]
+
+        @query_budget(10)
+        def view(request):
+            for user in users:
+                User.objects.filter(pk=user.pk).first()
+            return HttpResponse()
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'N+1: 3'):
+            self.run_view(view)
+
+    def test_within_budget(self):
+        """Укладывающийся в бюджет ответ получает счётчик запросов."""
+        @query_budget(2)
+        def view(request):
+            User.objects.count()
+            with exempt():
+                for _ in range(5):
+                    User.objects.exists()
+            return HttpResponse()
+
+        self.assertEqual(self.run_view(view)['X-Query-Count'], '1')
@@ -0,0 +1,90 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..page_cache import cache_page_tagged, page_timeout
+from ..replicas import PIN_COOKIE, ReplicaMiddleware, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=30)
+class ReplicaRouterTests(SimpleTestCase):
+    def run_view(self, view, request):
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request, seen)
+
+        middleware = ReplicaMiddleware(get_response)
+        response = middleware(request)
+        return seen, response
+
+    @staticmethod
+    @replica_reads
+    def reader(request, seen):
+        seen['read'] = router.db_for_read(None)
+        seen['timeout'] = page_timeout(3600)
+        router.db_for_write(None)
+        seen['after_write'] = router.db_for_read(None)
+        return HttpResponse()
+
+    def test_marked_view_reads_replica(self):
+        """GET помеченного представления читает из реплики до записи."""
+        seen, response = self.run_view(self.reader, RequestFactory().get('/'))
+        self.assertEqual(seen['read'], 'replica1')
+        self.assertEqual(seen['timeout'], 30)
+        self.assertEqual(seen['after_write'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_read(None), 'default')
+
+    def test_writes_pin_primary(self):
+        """После записи браузер читает из основной базы."""
+        factory = RequestFactory()
+        seen, response = self.run_view(self.reader, factory.post('/'))
+        self.assertEqual(seen['read'], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 30)
+        factory.cookies[PIN_COOKIE] = '1'
+        seen, _ = self.run_view(self.reader, factory.get('/'))
+        self.assertEqual(seen['read'], 'default')
+        self.assertEqual(seen['timeout'], 3600)
+
+    def test_unmarked_view_reads_primary(self):
+        """Непомеченные представления не читают из реплик."""
+        def view(request, seen):
+            seen['read'] = router.db_for_read(None)
+            return HttpResponse()
+
+        seen, _ = self.run_view(view, RequestFactory().get('/'))
+        self.assertEqual(seen['read'], 'default')
+
+    def test_replica_page_without_validators(self):
+        """Страница из реплики не получает ETag и Last-Modified."""
+        @replica_reads
+        @cache_page_tagged(60, 'replica_test', lambda seen: ['replica-test'])
+        def view(request, seen):
+            seen['read'] = router.db_for_read(None)
+            return HttpResponse('страница')
+
+        def get(pinned):
+            factory = RequestFactory()
+            if pinned:
+                factory.cookies[PIN_COOKIE] = '1'
+            request = factory.get('/replica-test/')
+            request.user = AnonymousUser()
+            return self.run_view(view, request)
+
+        cache.clear()
+        seen, response = get(pinned=False)
+        self.assertEqual(seen['read'], 'replica1')
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        # Копия из реплики не подтверждается и запросам к основной базе.
+        seen, response = get(pinned=True)
+        self.assertEqual(seen, {})
+        self.assertNotIn('ETag', response)
+        cache.clear()
+        seen, response = get(pinned=True)
+        self.assertEqual(seen['read'], 'default')
+        self.assertIn('ETag', response)
@@ -0,0 +1,29 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.sqlite import connection_pragmas, pragma_statements
+
+
+class SQLitePragmasTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+
+class ConnectionPragmasTests(SimpleTestCase):
+    @override_settings(SQLITE_PRAGMAS={'synchronous': 'NORMAL'})
+    def test_database_overrides(self):
+        """PRAGMAS базы дополняют и переопределяют общие."""
+        pragmas = connection_pragmas(
+            {'PRAGMAS': {'synchronous': 'OFF', 'query_only': 'ON'}}
+        )
+        self.assertEqual(pragma_statements(pragmas), [
+            'PRAGMA synchronous = OFF', 'PRAGMA query_only = ON',
+        ])
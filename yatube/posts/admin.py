@@ -1,16 +1,232 @@
-from django.contrib import admin
+import calendar
+from datetime import date, datetime, timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME, ActionForm
+from django.core.paginator import Paginator
+from django.db.models import F, Max, Min, QuerySet
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import bulk
 from .models import Post, Group, Comment, Follow
+from .search import filter_queryset
+
+
+# Дальше этого числа строки в списках админки не считаются.
+COUNT_LIMIT = 10000
+
+
+class CappedCountPaginator(Paginator):
+    """Пагинатор, который не считает строки дальше `COUNT_LIMIT`.
+
+    COUNT(*) по всей большой таблице стоит полного прохода по индексу.
+    Глубже первых страниц переходят через иерархию дат и фильтры.
+    """
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by()[:COUNT_LIMIT].count()
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """`dates()` для иерархии дат админки без полного прохода.
+
+    Штатный `dates()` группирует все строки по функции от даты, и
+    индекс не помогает. Здесь границы берутся через MIN/MAX, а каждый
+    год, месяц или день проверяется запросом EXISTS по диапазону,
+    который читает из индекса одну запись.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # SQLite берёт MIN или MAX из индекса, только если в запросе
+        # одно такое выражение, а иначе читает всю таблицу.
+        if args or not kwargs or not all(
+            isinstance(value, (Min, Max))
+            and isinstance(value.source_expressions[0], F)
+            for value in kwargs.values()
+        ):
+            return super().aggregate(*args, **kwargs)
+        return {
+            name: self._extreme(value) for name, value in kwargs.items()
+        }
+
+    def _extreme(self, aggregate):
+        field_name = aggregate.source_expressions[0].name
+        ordering = field_name if isinstance(aggregate, Min) else (
+            f'-{field_name}'
+        )
+        return self.filter(**{f'{field_name}__isnull': False}).order_by(
+            ordering
+        ).values_list(field_name, flat=True).first()
+
+    def dates(self, field_name, kind, order='ASC'):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        first = timezone.localtime(bounds['first']).date()
+        last = timezone.localtime(bounds['last']).date()
+        found = [
+            start for start, end in self._periods(first, last, kind)
+            if self.filter(**{
+                f'{field_name}__gte': self._aware(start),
+                f'{field_name}__lt': self._aware(end),
+            }).exists()
+        ]
+        return found if order == 'ASC' else found[::-1]
+
+    @staticmethod
+    def _aware(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    @staticmethod
+    def _periods(first, last, kind):
+        if kind == 'year':
+            for year in range(first.year, last.year + 1):
+                yield date(year, 1, 1), date(year + 1, 1, 1)
+        elif kind == 'month':
+            start = first.replace(day=1)
+            while start <= last:
+                days = calendar.monthrange(start.year, start.month)[1]
+                end = start + timedelta(days=days)
+                yield start, end
+                start = end
+        else:
+            day = first
+            while day <= last:
+                yield day, day + timedelta(days=1)
+                day += timedelta(days=1)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список, который не замедляется с ростом таблицы.
+
+    Поиск идёт по индексу FTS5 вместо LIKE '%…%', полное число строк
+    не считается, а стандартное удаление заменено действием, которое
+    удаляет весь выбранный набор несколькими запросами.
+    `search_fields` остаются, чтобы админка показывала строку поиска.
+    """
+    show_full_result_count = False
+    paginator = CappedCountPaginator
+    bulk_delete = None
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(
+            queryset.model, queryset.query, queryset.db
+        )
 
-class PostAdmin(admin.ModelAdmin):
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return filter_queryset(queryset, search_term), False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_set(self, request, queryset):
+        if request.POST.get('post') != 'yes':
+            context = {
+                **self.admin_site.each_context(request),
+                'title': 'Вы уверены?',
+                'opts': self.model._meta,
+                'count': queryset.count(),
+                'action': request.POST['action'],
+                'select_across': request.POST.get('select_across', '0'),
+                'index': request.POST.get('index', '0'),
+                'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+                'action_checkbox_name': ACTION_CHECKBOX_NAME,
+            }
+            return TemplateResponse(
+                request, 'admin/posts/delete_set_confirmation.html', context
+            )
+        deleted = self.bulk_delete(queryset)
+        self.message_user(
+            request, f'Удалено записей: {deleted}', messages.SUCCESS
+        )
+    delete_set.short_description = 'Удалить выбранные записи'
+    delete_set.allowed_permissions = ('delete',)
+
+
+class DuplicateFilter(admin.SimpleListFilter):
+    """Тексты, почти повторяющие более ранние, см. `posts.duplicates`."""
+    title = 'почти повторы'
+    parameter_name = 'duplicate'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Похожие на другие'),)
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(fingerprint__duplicate_of__isnull=False)
+        return queryset
+
+
+class GroupActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+        empty_label='без группы',
+    )
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = (DuplicateFilter,)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     empty_value_display = '-пусто-'
+    action_form = GroupActionForm
+    actions = ('move_to_group', 'delete_set')
+    bulk_delete = staticmethod(bulk.delete_posts)
+
+    def move_to_group(self, request, queryset):
+        group = GroupActionForm(request.POST).fields['group'].clean(
+            request.POST.get('group')
+        )
+        moved = bulk.move_posts(queryset, group)
+        self.message_user(
+            request,
+            f'Перенесено постов: {moved} в «{group or "без группы"}»',
+            messages.SUCCESS,
+        )
+    move_to_group.short_description = 'Перенести в выбранную группу'
+    move_to_group.allowed_permissions = ('change',)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post',)
+    list_select_related = ('author', 'post')
+    search_fields = ('text',)
+    raw_id_fields = ('author', 'post')
+    list_filter = (DuplicateFilter,)
+    actions = ('delete_set',)
+    bulk_delete = staticmethod(bulk.delete_comments)
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    show_full_result_count = False
+    paginator = CappedCountPaginator
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,266 @@
+"""JSON API лент, постов и комментариев только для чтения.
+
+Клиенты получают те же данные, что и HTML-ленты, без рендеринга
+шаблонов. Ленты листаются курсором `after` из поля `next` ответа, как
+`CursorPaginator`, размер страницы задаёт `limit` до `MAX_LIMIT`.
+Параметр `fields` перечисляет нужные поля через запятую: столбцы
+остальных не читаются (`.only()`), а автор и группа соединяются в
+том же запросе, только если их поля запрошены.
+
+Ответ собирается по мере чтения строк (`StreamingHttpResponse`):
+строки приходят из курсора базы порциями, и ни список объектов, ни
+весь JSON в памяти не лежат. Сам запрос выполняется ещё в
+представлении, поэтому его видят бюджет запросов и выбор реплики.
+"""
+import json
+from collections import namedtuple
+from functools import wraps
+from itertools import chain
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from core.query_budget import query_budget
+from core.replicas import replica_reads
+from .models import Comment, Group, Post
+from .paginators import CursorPaginator
+from .timeline import ORDERING as TIMELINE_ORDERING, timeline_posts
+
+
+User = get_user_model()
+
+POST_PER_PAGE = settings.POST_PER_PAGE
+COMMENTS_PER_PAGE = settings.COMMENTS_PER_PAGE
+COMMENTS_ORDERING = ('created', 'id')
+MAX_LIMIT = 100
+MAX_ID = 2 ** 63 - 1
+
+# Поле ответа: столбцы для `.only()` и значение из объекта.
+Field = namedtuple('Field', 'columns value')
+
+
+def _image(post):
+    if not post.image:
+        return None
+    return {
+        'url': post.image.url,
+        'width': post.image_width,
+        'height': post.image_height,
+    }
+
+
+POST_FIELDS = {
+    'id': Field(('id',), attrgetter('id')),
+    'text': Field(('text',), attrgetter('text')),
+    'pub_date': Field(('pub_date',), attrgetter('pub_date')),
+    'author': Field(('author__username',), attrgetter('author.username')),
+    'group': Field(
+        ('group__slug',), lambda post: post.group and post.group.slug
+    ),
+    'image': Field(('image', 'image_width', 'image_height'), _image),
+    'comments_count': Field(
+        ('comments_count',), attrgetter('comments_count')
+    ),
+}
+COMMENT_FIELDS = {
+    'id': Field(('id',), attrgetter('id')),
+    'post': Field(('post',), attrgetter('post_id')),
+    'text': Field(('text',), attrgetter('text')),
+    'created': Field(('created',), attrgetter('created')),
+    'author': Field(('author__username',), attrgetter('author.username')),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_view(view):
+    """Только GET, ошибки `ApiError` отдаются JSON с их статусом."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': error.message}, status=error.status)
+    return require_GET(wrapper)
+
+
+def _select(request, queryset, fields, ordering=()):
+    """Набор, читающий только поля из `fields=`, и имена этих полей."""
+    names = [
+        name.strip() for name in request.GET.get('fields', '').split(',')
+        if name.strip()
+    ] or list(fields)
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(fields)}'
+        )
+    columns = {column for name in names for column in fields[name].columns}
+    # Курсор следующей страницы строится по полям сортировки.
+    columns.update(
+        name for name in (name.lstrip('-') for name in ordering)
+        if name not in queryset.query.annotations
+    )
+    relations = {column.split('__')[0] for column in columns if '__' in column}
+    return queryset.select_related(*sorted(relations)).only(
+        *sorted(columns)
+    ), names
+
+
+def _limit(request, default):
+    try:
+        return min(max(int(request.GET['limit']), 1), MAX_LIMIT)
+    except (KeyError, ValueError):
+        return default
+
+
+def _dumps(value):
+    return json.dumps(
+        value, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':'),
+    )
+
+
+def _started(items):
+    """Выполняет запрос итератора сразу, а не при отправке ответа."""
+    for item in items:
+        return chain((item,), items)
+    return iter(())
+
+
+def _stream(items, names, fields, tail=dict):
+    """Части JSON-объекта: `results` по одному объекту, затем `tail()`."""
+    yield '{"results":['
+    for number, item in enumerate(items):
+        yield (',' if number else '') + _dumps({
+            name: fields[name].value(item) for name in names
+        })
+    yield ']' + ''.join(
+        f',{_dumps(key)}:{_dumps(value)}' for key, value in tail().items()
+    ) + '}'
+
+
+def _page(request, queryset, fields=POST_FIELDS, per_page=POST_PER_PAGE,
+          ordering=CursorPaginator.ORDERING):
+    queryset, names = _select(request, queryset, fields, ordering)
+    paginator = CursorPaginator(
+        queryset, _limit(request, per_page), ordering=ordering
+    )
+    after = request.GET.get('after')
+    # HTML-лента с плохим курсором показывает первую страницу, а клиент
+    # API должен узнать об ошибке, а не пройти ленту заново.
+    if after and paginator.decode_cursor(after) is None:
+        raise ApiError('Неверный курсор after')
+    items = _started(paginator.iterate(after))
+    return StreamingHttpResponse(
+        _stream(items, names, fields, lambda: {
+            'next': paginator.next_cursor
+        }),
+        content_type='application/json',
+    )
+
+
+@query_budget(1)
+@replica_reads
+@api_view
+def index(request):
+    return _page(request, Post.objects.all())
+
+
+@query_budget(2)
+@replica_reads
+@api_view
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    if group_id is None:
+        raise ApiError('Группа не найдена', 404)
+    return _page(request, Post.objects.filter(group_id=group_id))
+
+
+@query_budget(2)
+@replica_reads
+@api_view
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        raise ApiError('Автор не найден', 404)
+    return _page(request, Post.objects.filter(author_id=author_id))
+
+
+@query_budget(4)
+@replica_reads
+@api_view
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужно войти', 401)
+    return _page(
+        request, timeline_posts(request.user), ordering=TIMELINE_ORDERING
+    )
+
+
+@query_budget(1)
+@replica_reads
+@api_view
+def post_detail(request, post_id):
+    queryset, names = _select(request, Post.objects.all(), POST_FIELDS)
+    post = queryset.filter(id=post_id).first() if post_id <= MAX_ID else None
+    if post is None:
+        raise ApiError('Пост не найден', 404)
+    return JsonResponse(
+        {name: POST_FIELDS[name].value(post) for name in names},
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@query_budget(2)
+@replica_reads
+@api_view
+def post_comments(request, post_id):
+    if post_id > MAX_ID or not Post.objects.filter(id=post_id).exists():
+        raise ApiError('Пост не найден', 404)
+    return _page(
+        request,
+        Comment.objects.filter(post_id=post_id).order_by(*COMMENTS_ORDERING),
+        fields=COMMENT_FIELDS, per_page=COMMENTS_PER_PAGE,
+        ordering=COMMENTS_ORDERING,
+    )
+
+
+@query_budget(1)
+@replica_reads
+@api_view
+def posts_batch(request):
+    """Посты по списку `ids=1,2,3` в его порядке, ненайденные пропускаются."""
+    try:
+        ids = list(dict.fromkeys(
+            int(value) for value in request.GET.get('ids', '').split(',')
+            if value.strip()
+        ))
+    except ValueError:
+        ids = None
+    if ids is None or not all(0 < pk <= MAX_ID for pk in ids):
+        raise ApiError('ids — список положительных чисел через запятую')
+    if len(ids) > MAX_LIMIT:
+        raise ApiError(f'Не больше {MAX_LIMIT} постов за запрос')
+    queryset, names = _select(request, Post.objects.all(), POST_FIELDS)
+    posts = queryset.in_bulk(ids) if ids else {}
+    return StreamingHttpResponse(
+        _stream(
+            (posts[pk] for pk in ids if pk in posts), names, POST_FIELDS
+        ),
+        content_type='application/json',
+    )
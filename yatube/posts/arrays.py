@@ -0,0 +1,82 @@
+"""Векторные операции над массивами NumPy для пакетных расчётов.
+
+Группы строк задаются упорядоченными номерами групп, отрезки —
+началами и длинами, как в разреженных матрицах CSR.
+"""
+import numpy as np
+from django.db import connection
+
+
+def ranges(starts, counts):
+    """Все индексы отрезков [start, start + count) подряд."""
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    return np.repeat(starts - (ends - counts), counts) + np.arange(total)
+
+
+def sum_by_key(keys, weights):
+    """Упорядоченные различные ключи и суммы `weights` по ним."""
+    if not len(keys):
+        return keys, weights
+    order = np.argsort(keys)
+    keys, weights = keys[order], weights[order]
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[first], np.add.reduceat(weights, first)
+
+
+def top(groups, scores, size):
+    """Индексы `size` лучших по `scores` строк каждой группы.
+
+    `groups` должны быть упорядочены. Полная сортировка миллионов
+    строк медленная, поэтому группы близкой длины (до степени двойки)
+    кладутся строками в матрицу, и лучшие выбираются в каждой строке
+    `np.argpartition` за линейное время. Результат упорядочен по
+    группам, внутри группы — по убыванию оценки.
+    """
+    first = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[first, len(groups)])
+    first, counts = first[counts > 0], counts[counts > 0]
+    widths = 2 ** np.ceil(np.log2(counts)).astype(np.int64)
+    parts = [np.empty(0, dtype=np.int64)]
+    for width in np.unique(widths):
+        rows = np.flatnonzero(widths == width)
+        positions = ranges(first[rows], counts[rows])
+        cells = (
+            np.repeat(np.arange(len(rows)) * width, counts[rows])
+            + positions - np.repeat(first[rows], counts[rows])
+        )
+        matrix = np.full(len(rows) * width, -np.inf)
+        matrix[cells] = scores[positions]
+        index = np.full(len(rows) * width, -1)
+        index[cells] = positions
+        matrix = matrix.reshape(len(rows), width)
+        index = index.reshape(len(rows), width)
+        if width > size:
+            best = np.argpartition(-matrix, size - 1, axis=1)[:, :size]
+            matrix = np.take_along_axis(matrix, best, axis=1)
+            index = np.take_along_axis(index, best, axis=1)
+        order = np.argsort(-matrix, axis=1, kind='stable')
+        index = np.take_along_axis(index, order, axis=1)
+        parts.append(index[index >= 0])
+    selected = np.concatenate(parts)
+    return selected[np.argsort(groups[selected], kind='stable')]
+
+
+def insert(model, fields, *columns):
+    """Записывает столбцы (массивы NumPy или списки) строками `model`.
+
+    Миллионы строк через bulk_create стоили бы создания экземпляров
+    моделей, поэтому кортежи уходят в executemany напрямую.
+    """
+    quote = connection.ops.quote_name
+    opts = model._meta
+    names = ', '.join(quote(opts.get_field(name).column) for name in fields)
+    values = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(opts.db_table)} ({names}) VALUES ({values})',
+            zip(*(
+                column.tolist() if isinstance(column, np.ndarray) else column
+                for column in columns
+            )),
+        )
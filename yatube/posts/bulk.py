@@ -0,0 +1,110 @@
+"""Массовые операции над постами и комментариями для админки.
+
+Стандартное удаление Django загружает каждую строку и шлёт сигналы
+по одной, а сигналы приложения делают по несколько запросов на
+строку. Здесь весь набор обрабатывается несколькими запросами
+независимо от его размера: ссылки и строки удаляются по подзапросу,
+затронутые счётчики пересчитываются через `recount`, а страницы
+сбрасываются тегами авторов и групп.
+"""
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+from core.page_cache import invalidate
+from . import related
+from .cache_tags import FEED, author_tag, group_tag, post_tag, profile_tag
+from .counters import recount
+from .models import Group, Post
+
+
+User = get_user_model()
+
+
+def _keys(queryset):
+    return queryset.order_by().values('pk')
+
+
+def _delete(queryset):
+    """Удаляет строки вместе с теми, что ссылаются на них.
+
+    Связи с CASCADE удаляются тем же способом, с SET_NULL обнуляются,
+    в том числе скрытые через related_name='+'.
+    Возвращает число удалённых строк самого набора.
+    """
+    keys = _keys(queryset)
+    for relation in get_candidate_relations_to_delete(queryset.model._meta):
+        related = relation.related_model._base_manager.filter(
+            **{f'{relation.field.name}__in': keys}
+        )
+        if relation.on_delete is models.CASCADE:
+            _delete(related)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+    return queryset.model._base_manager.filter(
+        pk__in=keys
+    )._raw_delete(queryset.db)
+
+
+def _affected(queryset):
+    """Авторы и группы постов набора."""
+    rows = queryset.order_by().values_list('author_id', 'group_id').distinct()
+    author_ids, group_ids = set(), set()
+    for author_id, group_id in rows:
+        author_ids.add(author_id)
+        if group_id is not None:
+            group_ids.add(group_id)
+    return author_ids, group_ids
+
+
+def _invalidate(author_ids, group_ids):
+    usernames = User.objects.filter(
+        pk__in=author_ids
+    ).values_list('username', flat=True)
+    slugs = Group.objects.filter(
+        pk__in=group_ids
+    ).values_list('slug', flat=True)
+    invalidate(
+        FEED,
+        *(author_tag(pk) for pk in author_ids),
+        *(profile_tag(username) for username in usernames),
+        *(group_tag(slug) for slug in slugs),
+    )
+
+
+def delete_posts(queryset):
+    """Удаляет посты с комментариями и записями лент."""
+    with transaction.atomic():
+        author_ids, group_ids = _affected(queryset)
+        listing = related.listing_tags(_keys(queryset))
+        related.schedule_deleted(_keys(queryset))
+        deleted = _delete(queryset)
+        recount(users=author_ids, groups=group_ids, posts=())
+        _invalidate(author_ids, group_ids)
+        invalidate(*listing)
+    return deleted
+
+
+def move_posts(queryset, group):
+    """Переносит посты в группу `group` (None убирает из групп)."""
+    with transaction.atomic():
+        author_ids, group_ids = _affected(queryset)
+        if group is not None:
+            group_ids.add(group.pk)
+        moved = Post.objects.filter(pk__in=_keys(queryset)).update(
+            group=group
+        )
+        recount(users=(), groups=group_ids, posts=())
+        _invalidate(author_ids, group_ids)
+    return moved
+
+
+def delete_comments(queryset):
+    with transaction.atomic():
+        post_ids = set(
+            queryset.order_by().values_list('post_id', flat=True).distinct()
+        )
+        deleted = _delete(queryset)
+        recount(users=(), groups=(), posts=post_ids)
+        invalidate(*(post_tag(pk) for pk in post_ids))
+    return deleted
@@ -0,0 +1,78 @@
+"""Теги кэша страниц приложения posts."""
+from django.core.cache import cache
+
+from .models import Group, Post
+
+
+FEED = 'feed'
+# Подборки похожих постов всех страниц постов, см. `posts.related`.
+RELATED = 'related'
+POST_AUTHOR_KEY = 'post_author:{}'
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def profile_tag(username):
+    return f'profile:{username}'
+
+
+def author_tag(author_id):
+    return f'author:{author_id}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def index_tags():
+    return [FEED]
+
+
+def group_tags(slug):
+    return [group_tag(slug)]
+
+
+def profile_tags(username):
+    return [profile_tag(username)]
+
+
+def post_detail_tags(post_id):
+    # Автор поста не меняется, поэтому его можно запомнить навсегда.
+    author_id = cache.get_or_set(
+        POST_AUTHOR_KEY.format(post_id),
+        lambda: Post.objects.filter(
+            pk=post_id
+        ).values_list('author_id', flat=True).first(),
+        timeout=None,
+    )
+    return [post_tag(post_id), author_tag(author_id), RELATED]
+
+
+def tags_for_post(post, *group_ids):
+    """Теги всех страниц, на которых показан пост."""
+    group_ids = {pk for pk in (post.group_id, *group_ids) if pk}
+    slugs = Group.objects.filter(
+        pk__in=group_ids
+    ).values_list('slug', flat=True) if group_ids else ()
+    return [
+        FEED,
+        post_tag(post.pk),
+        author_tag(post.author_id),
+        profile_tag(post.author.username),
+        *(group_tag(slug) for slug in slugs),
+    ]
+
+
+def tags_for_group(group, *slugs):
+    """Теги всех страниц, на которых показаны группа или ссылки на неё."""
+    authors = Post.objects.filter(group=group).order_by().values_list(
+        'author_id', 'author__username'
+    ).distinct()
+    tags = [FEED]
+    for author_id, username in authors:
+        tags += [author_tag(author_id), profile_tag(username)]
+    return tags + [
+        group_tag(slug) for slug in {group.slug, *slugs} if slug
+    ]
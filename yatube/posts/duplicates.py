@@ -0,0 +1,302 @@
+"""Почти одинаковые посты и комментарии по подписям MinHash.
+
+Из текста остаются слова в нижнем регистре через одиночный пробел,
+и он режется на перекрывающиеся куски по `SHINGLE` символов. Подпись —
+`PERMUTATIONS` минимумов хэшей кусков при разных хэш-функциях. Доля
+совпавших минимумов двух подписей оценивает коэффициент Жаккара их
+множеств кусков, поэтому опечатка или пара заменённых слов почти не
+меняют подпись.
+
+Подпись режется на `BANDS` полос по `ROWS` значений, ключи полос лежат
+в `FingerprintBand` под индексом. Кандидаты для нового текста находятся
+одним запросом по его ключам, без перебора сохранённых подписей, и
+сходство проверяется только у `CANDIDATES` с наибольшим числом общих
+полос. Текст со сходством `SIMILARITY` попадает в кандидаты с
+вероятностью около 99 %, со сходством в треть — примерно в одном
+случае из пяти.
+
+Короткие тексты вроде «Спасибо, отличный пост!» не проверяются: у
+разных людей они законно совпадают. Почти повтор своего текста
+отклоняется, похожий на чужой сохраняется с отметкой `duplicate_of`
+для модерации.
+
+Команда `build_fingerprints` заново считает подписи всех постов и
+комментариев: хэши и минимумы считаются сразу для многих текстов, а
+повторы ищутся сортировкой ключей полос.
+"""
+import re
+from itertools import islice
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .arrays import insert, ranges, top
+from .models import Comment, Fingerprint, FingerprintBand, Post
+
+
+# Виды текстов совпадают с именами полей `Fingerprint`.
+POST, COMMENT = 'post', 'comment'
+SHINGLE = 5
+MIN_SHINGLES = 32
+PERMUTATIONS = 64
+ROWS = 4
+BANDS = PERMUTATIONS // ROWS
+SIMILARITY = 0.7
+# Столько кандидатов набирается только у массовой рассылки, и для
+# решения хватает части из них.
+CANDIDATES = 50
+# Кусков за один проход: матрица хэшей кусков по всем хэш-функциям
+# (2 МБ) остаётся в кэше процессора.
+SHINGLES_CHUNK = 2 ** 12
+# Ограничивает память: текстов, читаемых за раз.
+TEXTS_CHUNK = 10000
+REPEAT_ERROR = 'Вы уже публиковали почти такой же текст.'
+
+WORD_RE = re.compile(r'[^\W_]+')
+# Нечётное основание полиномиального хэша кусков и ключей полос.
+BASE = np.uint64(0x9E3779B97F4A7C15)
+KIND_SEEDS = {POST: 1, COMMENT: 2}
+# Хэш-функции подписи — умножение на нечётное число со сдвигом:
+# (a * x + b) mod 2**64 >> 32. Подписи хранятся в базе, поэтому
+# коэффициенты даёт RandomState с постоянным зерном: его
+# последовательность NumPy сохраняет между версиями.
+_random = np.random.RandomState(2022)
+MULTIPLIERS = _random.randint(
+    0, 2 ** 64, (PERMUTATIONS, 1), dtype=np.uint64
+) | np.uint64(1)
+INCREMENTS = _random.randint(0, 2 ** 64, (PERMUTATIONS, 1), dtype=np.uint64)
+
+
+def normalize(text):
+    """Слова текста в нижнем регистре через одиночный пробел."""
+    return ' '.join(WORD_RE.findall(text.lower().replace('ё', 'е')))
+
+
+def _shingle_hashes(codes, starts, counts):
+    """64-битные хэши всех кусков текстов подряд.
+
+    Текст начинается в кодах символов `codes` с `starts` и даёт
+    `counts` кусков.
+    """
+    positions = ranges(starts, counts)
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for offset in range(SHINGLE):
+        hashes = hashes * BASE + codes[positions + offset]
+    return hashes
+
+
+def signatures(texts):
+    """Номера текстов, у которых есть подпись, и подписи строками uint32."""
+    normalized = [normalize(text) for text in texts]
+    lengths = np.array([len(text) for text in normalized], dtype=np.int64)
+    counts = lengths - SHINGLE + 1
+    kept = np.flatnonzero(counts >= MIN_SHINGLES)
+    starts, counts = (np.cumsum(lengths) - lengths)[kept], counts[kept]
+    codes = np.frombuffer(
+        ''.join(normalized).encode('utf-32-le'), dtype='<u4'
+    ).astype(np.uint64)
+    ends = np.cumsum(counts)
+    bounds = np.unique(np.r_[
+        0,
+        np.searchsorted(
+            ends,
+            np.arange(SHINGLES_CHUNK, ends[-1] if len(ends) else 0,
+                      SHINGLES_CHUNK),
+            side='right',
+        ),
+        len(counts),
+    ])
+    result = np.empty((len(kept), PERMUTATIONS), dtype=np.uint32)
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        chunk_counts = counts[first:last]
+        hashes = _shingle_hashes(codes, starts[first:last], chunk_counts)
+        # Строки матрицы — хэш-функции: минимумы по текстам берутся
+        # вдоль непрерывных строк, а не через шаг.
+        values = (MULTIPLIERS * hashes + INCREMENTS) >> np.uint64(32)
+        result[first:last] = np.minimum.reduceat(
+            values, np.cumsum(chunk_counts) - chunk_counts, axis=1
+        ).T
+    return kept, result
+
+
+def band_keys(kind, rows):
+    """Ключи полос подписей вида `kind`: по `BANDS` на строку `rows`."""
+    values = rows.reshape(len(rows), BANDS, ROWS).astype(np.uint64)
+    keys = np.broadcast_to(
+        np.arange(BANDS, dtype=np.uint64)
+        + np.uint64(KIND_SEEDS[kind] * BANDS),
+        (len(rows), BANDS),
+    )
+    for row in range(ROWS):
+        keys = keys * BASE + values[:, :, row]
+    return keys.view(np.int64)
+
+
+class Check:
+    """Подпись нового текста и похожие на него сохранённые тексты.
+
+    `matches` — тройки (сходство, id подписи, id автора) по убыванию
+    сходства. `exclude` убирает из кандидатов подпись самого текста
+    при правке, например `{'post': post}`.
+    """
+
+    def __init__(self, kind, text, exclude=None):
+        kept, rows = signatures([text])
+        self.signature = rows[0] if len(kept) else None
+        self.matches = []
+        if self.signature is not None:
+            self.keys = band_keys(kind, rows)[0].tolist()
+            self.matches = self._find(exclude or {})
+
+    def _find(self, exclude):
+        # Чем больше общих полос, тем выше сходство, поэтому первыми
+        # идут самые вероятные повторы, в том числе свои у автора.
+        candidates = Fingerprint.objects.filter(
+            bands__key__in=self.keys
+        ).exclude(**exclude).annotate(
+            shared=Count('bands')
+        ).order_by('-shared', '-pk').values_list(
+            'pk', 'author_id', 'signature'
+        )[:CANDIDATES]
+        matches = []
+        for pk, author_id, stored in candidates:
+            similarity = np.count_nonzero(
+                np.frombuffer(stored, dtype='<u4') == self.signature
+            ) / PERMUTATIONS
+            if similarity >= SIMILARITY:
+                matches.append((similarity, pk, author_id))
+        return sorted(matches, reverse=True)
+
+    def repeats(self, author):
+        """Повторяет ли текст почти дословно другой текст `author`."""
+        return any(author_id == author.pk for _, _, author_id in self.matches)
+
+    def save(self, author, **target):
+        """Запоминает подпись нового текста `post=…` или `comment=…`."""
+        if self.signature is not None:
+            self._store(Fingerprint(author=author, **target))
+
+    def replace(self, post):
+        """Заменяет подпись отредактированного поста."""
+        fingerprint = Fingerprint.objects.filter(post=post).first()
+        if self.signature is not None:
+            self._store(fingerprint or Fingerprint(
+                author_id=post.author_id, post=post
+            ))
+        elif fingerprint is not None:
+            fingerprint.delete()
+
+    def _store(self, fingerprint):
+        is_new = fingerprint.pk is None
+        fingerprint.signature = self.signature.astype('<u4').tobytes()
+        fingerprint.duplicate_of_id = (
+            self.matches[0][1] if self.matches else None
+        )
+        fingerprint.save()
+        if not is_new:
+            fingerprint.bands.all().delete()
+        FingerprintBand.objects.bulk_create(
+            FingerprintBand(fingerprint=fingerprint, key=key)
+            for key in self.keys
+        )
+
+
+def check_form(form, kind, author, exclude=None):
+    """Проверяет текст формы и возвращает `Check` для сохранения.
+
+    Почти повтор своего текста становится ошибкой поля `text`, и
+    тогда возвращается None.
+    """
+    check = Check(kind, form.cleaned_data['text'], exclude)
+    if check.repeats(author):
+        form.add_error('text', REPEAT_ERROR)
+        return None
+    return check
+
+
+def _signatures_of(model):
+    """Первичные ключи, авторы и подписи текстов `model` по порядку."""
+    rows = model.objects.order_by('id').values_list(
+        'id', 'author_id', 'text'
+    ).iterator(chunk_size=TEXTS_CHUNK)
+    ids, author_ids, parts = [], [], []
+    while True:
+        chunk = list(islice(rows, TEXTS_CHUNK))
+        if not chunk:
+            break
+        kept, part = signatures([row[2] for row in chunk])
+        ids.extend(chunk[number][0] for number in kept)
+        author_ids.extend(chunk[number][1] for number in kept)
+        parts.append(part)
+    return ids, author_ids, np.concatenate(
+        [np.empty((0, PERMUTATIONS), dtype=np.uint32)] + parts
+    )
+
+
+def _originals(rows, keys):
+    """Номер самой похожей более ранней подписи для каждой или -1.
+
+    Кандидаты — первые по порядку подписи с общим ключом полосы.
+    """
+    count = len(rows)
+    if not count:
+        return np.empty(0, dtype=np.int64)
+    flat = keys.ravel()
+    owners = np.repeat(np.arange(count, dtype=np.int64), BANDS)
+    order = np.lexsort((owners, flat))
+    flat, owners = flat[order], owners[order]
+    first = np.r_[True, flat[1:] != flat[:-1]]
+    leaders = owners[first][np.cumsum(first) - 1]
+    other = leaders != owners
+    owners, leaders = np.divmod(
+        np.unique(owners[other] * count + leaders[other]), count
+    )
+    similarity = np.count_nonzero(
+        rows[owners] == rows[leaders], axis=1
+    ) / PERMUTATIONS
+    keep = similarity >= SIMILARITY
+    best = top(owners[keep], similarity[keep], 1)
+    originals = np.full(count, -1, dtype=np.int64)
+    originals[owners[keep][best]] = leaders[keep][best]
+    return originals
+
+
+def build():
+    """Заново считает подписи всех постов и комментариев.
+
+    Возвращает число подписей. Повторы в уже сохранённых текстах не
+    отклоняются, а отмечаются, в том числе у одного автора.
+    """
+    kinds = []
+    for kind, model in ((POST, Post), (COMMENT, Comment)):
+        ids, author_ids, rows = _signatures_of(model)
+        keys = band_keys(kind, rows)
+        kinds.append((kind, ids, author_ids, rows, keys, _originals(
+            rows, keys
+        )))
+    quote = connection.ops.quote_name
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for model in (FingerprintBand, Fingerprint):
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)}')
+        # Ключи назначаются заранее, чтобы сразу связать повторы и полосы.
+        next_id = 1
+        for kind, ids, author_ids, rows, keys, originals in kinds:
+            fingerprint_ids = np.arange(next_id, next_id + len(ids))
+            insert(
+                Fingerprint,
+                ('id', kind, 'author', 'signature', 'duplicate_of'),
+                fingerprint_ids, ids, author_ids,
+                [row.astype('<u4').tobytes() for row in rows],
+                [
+                    None if original < 0 else next_id + int(original)
+                    for original in originals
+                ],
+            )
+            insert(
+                FingerprintBand, ('fingerprint', 'key'),
+                np.repeat(fingerprint_ids, BANDS), keys.ravel(),
+            )
+            next_id += len(ids)
+    return next_id - 1
@@ -0,0 +1,50 @@
+"""Авторы, на которых подписан читатель.
+
+Кнопка подписки стоит у каждого поста в лентах, и проверка
+`exists()` на каждую кнопку стоила бы запроса на пост. Вместо этого
+id всех авторов читателя берутся одним запросом по индексу
+(user, author), лежат в кэше до его следующей подписки или отписки
+и запоминаются на запросе: все кнопки страницы обходятся без базы.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+
+FOLLOWING_KEY = 'following:{}'
+REQUEST_ATTRIBUTE = '_following_ids'
+
+
+def _load(user_id):
+    return frozenset(
+        Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True)
+    )
+
+
+def following_ids(request):
+    """Множество id авторов, на которых подписан пользователь запроса."""
+    user = request.user
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(request, REQUEST_ATTRIBUTE, None)
+    if ids is None:
+        ids = cache.get_or_set(
+            FOLLOWING_KEY.format(user.pk),
+            lambda: _load(user.pk),
+            timeout=None,
+        )
+        setattr(request, REQUEST_ATTRIBUTE, ids)
+    return ids
+
+
+def forget(user_id):
+    """Сбрасывает закэшированное множество пользователя."""
+    key = FOLLOWING_KEY.format(user_id)
+    cache.delete(key)
+    if transaction.get_connection().in_atomic_block:
+        # Множество кэшируется без срока: запрос, прочитавший базу до
+        # коммита подписки, иначе навсегда вернул бы в кэш старое.
+        transaction.on_commit(lambda: cache.delete(key))
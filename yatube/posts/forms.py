@@ -1,4 +1,5 @@
 from django import forms
+from .images import ingest
 from .models import Post, Comment
 
 
@@ -7,6 +8,22 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        image = self.cleaned_data.get('image')
+        if 'image' in self.changed_data:
+            post.image_width = post.image_height = None
+            post.image_placeholder = ''
+            if image:
+                ingested = ingest(image)
+                post.image.save(image.name, ingested.content, save=False)
+                post.image_width, post.image_height = ingested.size
+                post.image_placeholder = ingested.placeholder
+        if commit:
+            post.save()
+            self._save_m2m()
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,75 @@
+"""Персональные фрагменты страниц постов, см. `core.fragments`."""
+from django.conf import settings
+
+from core import fragments
+from .following import following_ids
+from .forms import CommentForm
+from .models import AuthorSuggestion
+
+
+SUGGESTIONS_SHOWN = settings.AUTHOR_SUGGESTIONS_SHOWN
+
+
+def switcher_context(request, active):
+    return {active: True}
+
+
+def follow_button_context(request, author_id, username, small=False):
+    user = request.user
+    button_visible = user.is_authenticated and user.pk != author_id
+    return {
+        'button_visible': button_visible,
+        'following': button_visible and author_id in following_ids(request),
+        'username': username,
+        'small': small,
+    }
+
+
+def author_suggestions_context(request):
+    if not request.user.is_authenticated:
+        return {'suggestions': ()}
+    # Подборка пересчитывается пачкой, а подписаться можно и раньше.
+    followed = following_ids(request)
+    suggestions = AuthorSuggestion.objects.filter(
+        user=request.user
+    ).select_related('author').order_by('-score')
+    return {
+        'suggestions': [
+            suggestion for suggestion in suggestions
+            if suggestion.author_id not in followed
+        ][:SUGGESTIONS_SHOWN],
+    }
+
+
+def post_actions_context(request, post_id, author_id):
+    return {
+        'can_edit': request.user.pk == author_id,
+        'post_id': post_id,
+    }
+
+
+def comment_form_context(request, post_id):
+    return {
+        'form': CommentForm(),
+        'post_id': post_id,
+    }
+
+
+def register():
+    fragments.register(
+        'switcher', 'includes/switcher.html', switcher_context
+    )
+    fragments.register(
+        'follow_button', 'includes/follow_button.html', follow_button_context
+    )
+    fragments.register(
+        'author_suggestions',
+        'includes/author_suggestions.html',
+        author_suggestions_context,
+    )
+    fragments.register(
+        'post_actions', 'includes/post_actions.html', post_actions_context
+    )
+    fragments.register(
+        'comment_form', 'includes/comment_form.html', comment_form_context
+    )
@@ -0,0 +1,112 @@
+"""Обработка загруженных картинок постов.
+
+Оригинал уменьшается до `IMAGE_MAX_SIZE` по длинной стороне ещё при
+декодировании (draft для JPEG, reduce для остальных форматов),
+поворачивается по EXIF и сохраняется без метаданных. Сжатые варианты
+в форматах `IMAGE_VARIANT_FORMATS` создаются для миниатюр, см.
+`posts.thumbnails`, если их поддерживает установленный Pillow. AVIF
+появляется после установки пакета pillow-avif-plugin.
+
+Для ленивой загрузки вычисляется заглушка: кадрирование миниатюры
+шириной `IMAGE_PLACEHOLDER_WIDTH` пикселей в виде data: URI. Браузер
+растягивает её с размытием, пока не загрузится сама картинка.
+"""
+import base64
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pillow_avif = None
+
+
+MAX_SIZE = settings.IMAGE_MAX_SIZE
+QUALITY = settings.IMAGE_QUALITY
+PLACEHOLDER_WIDTH = settings.IMAGE_PLACEHOLDER_WIDTH
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+# Из метаданных оставляем только то, без чего исказится сама картинка.
+KEEP_INFO = ('icc_profile', 'transparency')
+ENCODER_OPTIONS = {
+    'JPEG': {'quality': QUALITY, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': QUALITY},
+    'AVIF': {'quality': QUALITY},
+}
+
+Image.init()
+VARIANT_FORMATS = tuple(
+    format_ for format_ in settings.IMAGE_VARIANT_FORMATS
+    if format_ in Image.SAVE
+)
+
+Ingested = namedtuple('Ingested', 'content size placeholder')
+
+
+def _encode(image, format_):
+    buffer = BytesIO()
+    image.save(buffer, format_, **ENCODER_OPTIONS.get(format_, {}))
+    return buffer.getvalue()
+
+
+def _load(file):
+    """Декодирует картинку сразу в размер не больше MAX_SIZE."""
+    image = Image.open(file)
+    scale = MAX_SIZE / max(image.size)
+    if scale < 1:
+        # JPEG-декодер пропускает коэффициенты и отдаёт картинку
+        # в 2, 4 или 8 раз меньше, не распаковывая полный размер.
+        image.draft(image.mode, (
+            int(image.width * scale), int(image.height * scale)
+        ))
+    image = ImageOps.exif_transpose(image)
+    if scale < 1:
+        image.thumbnail((MAX_SIZE, MAX_SIZE), reducing_gap=3.0)
+    image.info = {
+        key: value for key, value in image.info.items() if key in KEEP_INFO
+    }
+    return image
+
+
+def placeholder(image):
+    """Заглушка с пропорциями самой крупной миниатюры."""
+    width, height = map(int, settings.THUMBNAIL_PRESETS[-1][0].split('x'))
+    size = (
+        PLACEHOLDER_WIDTH, max(round(PLACEHOLDER_WIDTH * height / width), 1)
+    )
+    # Для ещё не декодированного JPEG хватит масштаба 1/8.
+    image.draft('RGB', size)
+    tiny = ImageOps.fit(image.convert('RGB'), size, Image.BOX)
+    buffer = BytesIO()
+    tiny.save(buffer, 'PNG', optimize=True)
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def ingest(file):
+    """Готовит загрузку к сохранению.
+
+    Возвращает `Ingested` с обработанным оригиналом, его размером и
+    заглушкой. Анимированные картинки и форматы, которые Pillow умеет
+    читать, но не записывать (например, PSD), возвращаются без изменений.
+    """
+    file.seek(0)
+    with Image.open(file) as probe:
+        format_ = probe.format
+        if getattr(probe, 'is_animated', False) or format_ not in Image.SAVE:
+            size, tiny = probe.size, placeholder(probe)
+            file.seek(0)
+            return Ingested(
+                ContentFile(file.read(), name=file.name), size, tiny
+            )
+    file.seek(0)
+    image = _load(file)
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    content = ContentFile(_encode(image, format_), name=file.name)
+    return Ingested(content, image.size, placeholder(image))
@@ -0,0 +1,88 @@
+import statistics
+import time
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageOps
+
+from posts.images import ENCODER_OPTIONS, VARIANT_FORMATS, ingest
+from posts.thumbnails import PRESETS
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает декодирование и размер отдаваемых картинок '
+        'до и после обработки загрузки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=4032)
+        parser.add_argument('--height', type=int, default=3024)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        upload = self.photo(options['width'], options['height'])
+        started = time.perf_counter()
+        ingested = ingest(SimpleUploadedFile('photo.jpg', upload))
+        ingest_time = time.perf_counter() - started
+        stored = ingested.content.read()
+        self.stdout.write(
+            f'Обработка загрузки: {ingest_time * 1000:.0f} мс, '
+            f'{ingested.size[0]}x{ingested.size[1]}'
+        )
+        self.stdout.write(
+            f'{"файл":<16} {"байт":>10} {"декодирование, мс":>18} '
+            f'{"миниатюра, мс":>14}'
+        )
+        for name, data in (('загрузка', upload), ('оригинал', stored)):
+            decode, thumbnail = self.timings(data, options['repeat'])
+            self.stdout.write(
+                f'{name:<16} {len(data):>10} {decode:>18.1f} '
+                f'{thumbnail:>14.1f}'
+            )
+        self.stdout.write('Размер отдаваемой миниатюры:')
+        thumbnail = self.thumbnail(Image.open(BytesIO(stored)))
+        for format_ in ('JPEG', *VARIANT_FORMATS):
+            buffer = BytesIO()
+            thumbnail.save(buffer, format_, **ENCODER_OPTIONS[format_])
+            self.stdout.write(
+                f'{format_.lower():<16} {len(buffer.getvalue()):>10}'
+            )
+
+    def photo(self, width, height):
+        """JPEG, похожий на снимок с телефона: шум, градиент и EXIF."""
+        noise = Image.effect_noise((width, height), 40).convert('RGB')
+        gradient = Image.linear_gradient('L').resize((width, height))
+        colors = Image.merge('RGB', (
+            gradient,
+            noise.getchannel(0),
+            gradient.transpose(Image.FLIP_TOP_BOTTOM),
+        ))
+        image = Image.blend(noise, colors, 0.7)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=92, exif=exif.tobytes())
+        return buffer.getvalue()
+
+    def thumbnail(self, image):
+        geometry = PRESETS[0][0]
+        size = tuple(int(value) for value in geometry.split('x'))
+        return ImageOps.fit(image.convert('RGB'), size)
+
+    def timings(self, data, repeat):
+        decode, thumbnail = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            image = Image.open(BytesIO(data))
+            image.load()
+            decode.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            self.thumbnail(Image.open(BytesIO(data)))
+            thumbnail.append(time.perf_counter() - started)
+        return (
+            statistics.median(decode) * 1000,
+            statistics.median(thumbnail) * 1000,
+        )
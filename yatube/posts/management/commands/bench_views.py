@@ -0,0 +1,247 @@
+import json
+import platform
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.query_budget import QueryCounter
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+# Метрики, рост которых считается регрессией, и допустимый рост в %.
+COMPARED = {
+    'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+    'queries': 0, 'bytes': 5, 'alloc_blocks': 10,
+}
+
+
+def percentile(values, percent):
+    """Перцентиль с линейной интерполяцией между соседними значениями.
+
+    Работает и для одного значения, в отличие от `statistics.quantiles`,
+    которого к тому же нет в Python 3.7.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (
+        ordered[upper] - ordered[lower]
+    ) * (position - lower)
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержку, число запросов, размер ответа и выделения '
+        'памяти представлений posts на заполненной базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--views', nargs='+', choices=VIEWS, default=VIEWS,
+        )
+        parser.add_argument(
+            '--cache', choices=('cold', 'warm'), default='cold',
+            help='cold очищает кэш перед каждым запросом',
+        )
+        parser.add_argument('--output', help='Куда записать JSON')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого запуска для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=10,
+            help='Допустимый рост задержки в процентах',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Завершиться с ошибкой, если есть регрессии',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        if not Post.objects.exists():
+            raise CommandError(
+                'В базе нет постов, сначала запустите seed_data'
+            )
+        client = Client()
+        reader = self.reader()
+        client.force_login(reader)
+        results = {}
+        for name, url in self.targets(reader).items():
+            if name in options['views']:
+                results[name] = self.measure(client, url)
+                self.report(name, results[name])
+        data = {'meta': self.meta(reader), 'views': results}
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(data, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(baseline['views'], results)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'Регрессий: {regressions}')
+
+    # Набор страниц
+
+    def reader(self):
+        """Читатель с самой большой лентой подписок."""
+        reader = User.objects.annotate(
+            following_total=Count('follower')
+        ).order_by('-following_total').first()
+        if reader is None:
+            raise CommandError('В базе нет пользователей')
+        return reader
+
+    def targets(self, reader):
+        """Самые тяжёлые страницы каждого вида."""
+        group = Group.objects.order_by('-posts_count').first()
+        author = User.objects.order_by('-profile__posts_count').first()
+        post = Post.objects.order_by('-comments_count').first()
+        targets = {
+            'index': reverse('posts:main_page'),
+            'profile': reverse('posts:profile', args=[author.username]),
+            'post_detail': reverse('posts:post_detail', args=[post.pk]),
+            'follow_index': reverse('posts:follow_index'),
+        }
+        if group is not None:
+            targets['group_posts'] = reverse(
+                'posts:group_list', args=[group.slug]
+            )
+        return targets
+
+    def meta(self, reader):
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cache': self.options['cache'],
+            'iterations': self.options['iterations'],
+            'reader': reader.username,
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        }
+
+    # Замеры
+
+    def request(self, client, url):
+        if self.options['cache'] == 'cold':
+            cache.clear()
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return elapsed, len(counter.queries), len(response.content)
+
+    def allocations(self, client, url):
+        """Пиковая память и число живых блоков за один запрос.
+
+        Отдельные проходы: tracemalloc сильно замедляет код и исказил
+        бы задержки. Пик снимается в своём проходе, чтобы в него не
+        попал снимок памяти (`reset_peak` есть только с Python 3.9).
+        """
+        if self.options['cache'] == 'cold':
+            cache.clear()
+        tracemalloc.start()
+        try:
+            client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        if self.options['cache'] == 'cold':
+            cache.clear()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            client.get(url)
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        blocks = sum(
+            max(stat.count_diff, 0)
+            for stat in after.compare_to(before, 'filename')
+        )
+        return peak, blocks
+
+    def measure(self, client, url):
+        for _ in range(self.options['warmup']):
+            self.request(client, url)
+        timings, queries, sizes = [], [], []
+        for _ in range(self.options['iterations']):
+            elapsed, count, size = self.request(client, url)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+            sizes.append(size)
+        peak, blocks = self.allocations(client, url)
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+            'bytes': max(sizes),
+            'alloc_peak_kb': round(peak / 1024, 1),
+            'alloc_blocks': blocks,
+        }
+
+    # Вывод
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<13} p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'p99 {result["p99_ms"]:>8.2f} мс  '
+            f'запросов {result["queries"]:>3}  '
+            f'байт {result["bytes"]:>7}  '
+            f'пик {result["alloc_peak_kb"]:>8.1f} КБ  '
+            f'блоков {result["alloc_blocks"]:>6}'
+        )
+
+    def compare(self, baseline, results):
+        """Печатает изменения относительно базовой линии.
+
+        Возвращает число регрессий.
+        """
+        regressions = 0
+        self.stdout.write('Сравнение с базовой линией:')
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            for metric, allowed in COMPARED.items():
+                old, new = baseline[name][metric], result[metric]
+                change = (new - old) / old * 100 if old else 0
+                if allowed is None:
+                    allowed = self.options['threshold']
+                worse = new > old and change > allowed
+                regressions += worse
+                line = (
+                    f'  {name:<13} {metric:<13} {old:>10} -> {new:>10} '
+                    f'({change:+.1f}%)'
+                )
+                self.stdout.write(
+                    self.style.ERROR(line) if worse else line
+                )
+        return regressions
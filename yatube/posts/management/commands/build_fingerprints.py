@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново считает подписи MinHash всех постов и комментариев '
+        'и отмечает почти повторы'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fingerprints = duplicates.build()
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписей: {fingerprints} '
+            f'за {time.perf_counter() - started:.2f} с'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и чинит счётчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        fixed = recount()
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено строк со счётчиками: {fixed}')
+        )
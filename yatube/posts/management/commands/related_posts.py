@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import related
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие посты по векторам TF-IDF для постов, '
+        'чей текст менялся'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Заново векторизовать все посты и пересчитать подборки',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        posts = related.refresh(full=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено подборок: {posts} '
+            f'за {time.perf_counter() - started:.2f} с'
+        ))
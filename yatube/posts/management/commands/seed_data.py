@@ -0,0 +1,284 @@
+import bisect
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import timeline
+from posts.counters import create_missing_profiles, recount
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет bulk_create записать свои даты в поля auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def zipf_weights(count, exponent, rng):
+    """Накопленные веса степенного закона в случайном порядке.
+
+    Вес элемента ранга r пропорционален r ** -exponent, ранги
+    перемешаны, чтобы популярность не совпадала с порядком вставки.
+    """
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(itertools.accumulate(rank ** -exponent for rank in ranks))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками со степенным распределением'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20000,
+            help='Число подписок (рёбер графа)',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты постов',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000,
+            help='Строк в одной транзакции',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Строк в одном INSERT; SQLite допускает не больше 500',
+        )
+        parser.add_argument(
+            '--password',
+            help='Пароль всех пользователей; по умолчанию вход запрещён',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.now = timezone.now()
+        self.started = time.monotonic()
+        if connection.vendor == 'sqlite':
+            # Индексы лент и комментариев не помещаются в кэш страниц
+            # SQLite по умолчанию (2 МБ), и вставка упирается в диск.
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        popularity = zipf_weights(
+            len(user_ids), options['exponent'], self.rng
+        )
+        posts = self.create_posts(
+            options['posts'], user_ids, group_ids, popularity
+        )
+        self.create_comments(options['comments'], user_ids, posts)
+        self.create_follows(options['follows'], user_ids, popularity)
+
+        self.stage('Пересчёт счётчиков')
+        recount()
+        self.stage('Пересборка лент')
+        entries = timeline.rebuild()
+        self.stdout.write(f'  записей в лентах: {entries}')
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - self.started:.0f} с'
+        ))
+
+    # Вставка
+
+    def stage(self, title):
+        now = time.monotonic()
+        self.stdout.write(f'{title}... ({now - self.started:.0f} с)')
+
+    def insert(self, model, objects, total):
+        """Пишет объекты пачками bulk_create, по транзакции на кусок."""
+        done = 0
+        for chunk in chunked(objects, self.options['chunk_size']):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    chunk,
+                    batch_size=self.options['batch_size'],
+                    ignore_conflicts=True,
+                )
+            done += len(chunk)
+            self.stdout.write(f'  {model.__name__}: {done}/{total}')
+
+    def new_ids(self, model, last_id):
+        # SQLite не возвращает ключи из bulk_create, поэтому новые
+        # строки находятся по ключу больше прежнего максимума.
+        return list(model.objects.filter(
+            pk__gt=last_id
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def last_id(self, model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+
+    # Сущности
+
+    def create_users(self, count):
+        self.stage('Пользователи')
+        password = make_password(self.options['password'])
+        last_id = self.last_id(User)
+        fake = self.fake
+
+        def users():
+            for number in range(count):
+                profile = fake.simple_profile()
+                first_name, _, last_name = profile['name'].partition(' ')
+                yield User(
+                    username=f'{profile["username"]}{number}'[:150],
+                    first_name=first_name[:30],
+                    last_name=last_name[:150],
+                    email=profile['mail'],
+                    password=password,
+                    date_joined=self.now,
+                )
+
+        self.insert(User, users(), count)
+        create_missing_profiles()
+        return self.new_ids(User, last_id)
+
+    def create_groups(self, count):
+        self.stage('Группы')
+        last_id = self.last_id(Group)
+        fake = self.fake
+        self.insert(Group, (
+            Group(
+                title=fake.catch_phrase()[:200],
+                slug=f'{fake.slug()}-{number}'[:50],
+                description=fake.paragraph(),
+            ) for number in range(count)
+        ), count)
+        return self.new_ids(Group, last_id)
+
+    def create_posts(self, count, user_ids, group_ids, popularity):
+        """Популярные авторы пишут больше; треть постов без группы."""
+        self.stage('Посты')
+        last_id = self.last_id(Post)
+        rng, fake = self.rng, self.fake
+        seconds = self.options['days'] * 24 * 60 * 60
+
+        def posts():
+            for _ in range(count):
+                author = user_ids[
+                    bisect.bisect(popularity, rng.random() * popularity[-1])
+                ]
+                yield Post(
+                    text=fake.paragraph(nb_sentences=rng.randint(1, 8)),
+                    author_id=author,
+                    group_id=(
+                        rng.choice(group_ids)
+                        if group_ids and rng.random() > 0.33 else None
+                    ),
+                    pub_date=self.now - timedelta(
+                        seconds=rng.randrange(seconds)
+                    ),
+                )
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.insert(Post, posts(), count)
+        return list(Post.objects.filter(
+            pk__gt=last_id
+        ).values_list('pk', 'author_id', 'pub_date'))
+
+    def create_comments(self, count, user_ids, posts):
+        """Обсуждения тоже распределены степенным законом по постам."""
+        self.stage('Комментарии')
+        if not posts or not user_ids:
+            return
+        rng, fake = self.rng, self.fake
+        weights = zipf_weights(len(posts), self.options['exponent'], rng)
+
+        def comments():
+            for _ in range(count):
+                post_id, _, pub_date = posts[
+                    bisect.bisect(weights, rng.random() * weights[-1])
+                ]
+                age = max(int((self.now - pub_date).total_seconds()), 1)
+                yield Comment(
+                    post_id=post_id,
+                    author_id=rng.choice(user_ids),
+                    text=fake.sentence(),
+                    created=pub_date + timedelta(seconds=rng.randrange(age)),
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, comments(), count)
+
+    def create_follows(self, count, user_ids, popularity):
+        """Граф подписок со степенным распределением входящих рёбер.
+
+        Число подписок читателя распределено по Парето, а автор
+        выбирается с вероятностью, пропорциональной его популярности.
+        """
+        self.stage('Подписки')
+        if len(user_ids) < 2:
+            return
+        rng = self.rng
+        activity = [rng.paretovariate(1.5) for _ in user_ids]
+        scale = count / sum(activity)
+        existing = set(Follow.objects.values_list('user_id', 'author_id'))
+
+        def follows():
+            for user_id, weight in zip(user_ids, activity):
+                degree = min(round(weight * scale), len(user_ids) - 1)
+                authors = set()
+                # Популярных авторов выбирают повторно, поэтому попыток
+                # больше, чем нужно подписок.
+                for _ in range(degree * 3):
+                    if len(authors) >= degree:
+                        break
+                    author_id = user_ids[bisect.bisect(
+                        popularity, rng.random() * popularity[-1]
+                    )]
+                    if (
+                        author_id != user_id
+                        and (user_id, author_id) not in existing
+                    ):
+                        authors.add(author_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.insert(Follow, follows(), count)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации авторов по совместным подпискам '
+        'для пользователей, чьи подписки менялись'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать подборки всех пользователей',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = suggestions.refresh(full=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено подборок: {users} '
+            f'за {time.perf_counter() - started:.2f} с'
+        ))
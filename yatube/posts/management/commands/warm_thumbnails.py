@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры и запоминает размеры и заглушки картинок '
+        'уже опубликованных постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=thumbnails.WORKERS or 1,
+            help='Число процессов для генерации миниатюр',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать и посты, у которых размеры уже известны',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(
+                Q(image_width__isnull=True) | Q(image_placeholder='')
+            )
+        names = {}
+        for pk, name in posts.values_list('pk', 'image').iterator():
+            names.setdefault(name, []).append(pk)
+        if options['workers'] > 1:
+            results = thumbnails.get_executor(options['workers']).map(
+                thumbnails.try_generate, names, chunksize=8
+            )
+        else:
+            results = map(thumbnails.try_generate, names)
+        updated = []
+        failed = 0
+        for name, result, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            _, width, height, placeholder = result
+            for pk in names[name]:
+                updated.append(Post(
+                    pk=pk, image_width=width, image_height=height,
+                    image_placeholder=placeholder,
+                ))
+        Post.objects.bulk_update(
+            updated,
+            ['image_width', 'image_height', 'image_placeholder'],
+            batch_size=500,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names) - failed}, '
+            f'постов: {len(updated)}'
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'Пропущено картинок с ошибками: {failed}'
+            ))
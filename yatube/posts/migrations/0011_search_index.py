@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from posts import search
+
+    with schema_editor.connection.cursor() as cursor:
+        search.create_index(cursor)
+
+
+def drop_index(apps, schema_editor):
+    from posts import search
+
+    with schema_editor.connection.cursor() as cursor:
+        search.drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
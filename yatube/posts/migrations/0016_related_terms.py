@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTerm',
+            fields=[
+                ('number', models.IntegerField(primary_key=True, serialize=False, verbose_name='Номер')),
+                ('documents', models.PositiveIntegerField(verbose_name='Постов')),
+                ('posts', models.BinaryField(verbose_name='Лидеры')),
+                ('weights', models.BinaryField(verbose_name='Веса лидеров')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='postvector',
+            name='post',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='vector', serialize=False, to='posts.Post', verbose_name='Пост'),
+        ),
+    ]
@@ -1,6 +1,5 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models import constraints
 
 
 User = get_user_model()
@@ -10,6 +9,19 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Постов',
+        default=0,
+        editable=False
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Прежний адрес группы сбрасывается в кэше при смене slug.
+        if 'slug' in instance.__dict__:
+            instance._loaded_slug = instance.slug
+        return instance
 
     def __str__(self):
         return f'Сообщество: {self.title}'
@@ -18,6 +30,17 @@ class Group(models.Model):
 class Post(models.Model):
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            # Ленты автора и группы читаются по ключу (-pub_date, -id).
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+        )
 
     text = models.TextField(
         verbose_name='Текст поста',
@@ -47,6 +70,37 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False,
+        help_text='Крошечная копия картинки в виде data: URI'
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки нужна счётчикам при смене группы.
+        if 'group_id' in instance.__dict__:
+            instance._loaded_group_id = instance.group_id
+        return instance
 
     def __str__(self):
         return self.text[:15]
@@ -68,15 +122,27 @@ class Comment(models.Model):
     text = models.TextField(help_text='Текст нового комментария')
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            # Порции комментариев поста выбираются по ключу (created, id).
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx'
+            ),
+        )
+
     def __str__(self):
         return self.text[:15]
 
 
 class Follow(models.Model):
     class Meta:
-        constraints.UniqueConstraint(
-            fields=['user', 'author'],
-            name='unique_follow'
+        constraints = (
+            # Индекс ограничения отвечает и на проверку подписки.
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
         )
 
     user = models.ForeignKey(
@@ -94,3 +160,269 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user.username} подписан на {self.author.username}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            # Страница ленты читается из индекса без сортировки.
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_feed_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'
+            ),
+        )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class AuthorSuggestion(models.Model):
+    """Автор, которого стоит предложить пользователю.
+
+    Заполняется пачкой командой `suggest_authors`, см. `posts.suggestions`.
+    """
+
+    class Meta:
+        indexes = (
+            # Подборка пользователя читается из индекса без сортировки.
+            models.Index(
+                fields=('user', '-score'),
+                name='suggestion_user_score_idx'
+            ),
+        )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='author_suggestions',
+        verbose_name='Читатель'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    score = models.FloatField('Сходство')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.author_id}'
+
+
+class SuggestionRefresh(models.Model):
+    """Отметка, что подписки пользователя менялись.
+
+    Строка добавляется при каждой подписке и отписке, а команда
+    `suggest_authors` пересчитывает подборки отмеченных пользователей
+    и удаляет обработанные отметки.
+    """
+
+    # При удалении пользователя его подписки удаляются раньше него и
+    # сами добавляют отметки, поэтому отметка может его пережить.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+
+    def __str__(self):
+        return f'{self.user_id}'
+
+
+class PostVector(models.Model):
+    """Частоты термов текста поста, учтённые в `RelatedTerm`.
+
+    Номера термов (uint32) и их частоты (uint16) хранятся байтами
+    массивов NumPy. Вектор пишется командой `related_posts` и
+    переживает удаление поста: следующий пересчёт вычтет его термы из
+    частот документов, см. `posts.related`.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='vector',
+        verbose_name='Пост'
+    )
+    terms = models.BinaryField('Термы')
+    counts = models.BinaryField('Частоты')
+
+    def __str__(self):
+        return f'{self.post_id}'
+
+
+class RelatedTerm(models.Model):
+    """Терм корпуса похожих постов, см. `posts.related`.
+
+    `documents` — число постов с термом, у строки `related.CORPUS` —
+    число всех постов с векторами. `posts` и `weights` — список лидеров
+    терма: первичные ключи постов (int64) и их веса без множителя IDF
+    (float64) байтами массивов NumPy.
+    """
+
+    number = models.IntegerField('Номер', primary_key=True)
+    documents = models.PositiveIntegerField('Постов')
+    posts = models.BinaryField('Лидеры')
+    weights = models.BinaryField('Веса лидеров')
+
+    def __str__(self):
+        return f'{self.number}'
+
+
+class RelatedPost(models.Model):
+    """Похожий пост, заполняется командой `related_posts`."""
+
+    class Meta:
+        indexes = (
+            # Блок похожих постов читается из индекса без сортировки.
+            models.Index(
+                fields=('post', '-score'),
+                name='related_post_score_idx'
+            ),
+        )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_posts',
+        verbose_name='Пост'
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий пост'
+    )
+    score = models.FloatField('Сходство')
+
+    def __str__(self):
+        return f'{self.post_id}: {self.related_id}'
+
+
+class RelatedRefresh(models.Model):
+    """Отметка, что текст поста менялся и его соседей нужно пересчитать.
+
+    Как и `SuggestionRefresh`, отметка не мешает удалить пост.
+    """
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+        verbose_name='Пост'
+    )
+
+    def __str__(self):
+        return f'{self.post_id}'
+
+
+class Fingerprint(models.Model):
+    """Подпись MinHash поста или комментария, см. `posts.duplicates`.
+
+    Заполнено ровно одно из полей `post` и `comment`. `duplicate_of`
+    отмечает текст, почти повторяющий более ранний, для модерации.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='fingerprint',
+        verbose_name='Пост'
+    )
+    comment = models.OneToOneField(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='fingerprint',
+        verbose_name='Комментарий'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    signature = models.BinaryField('Подпись')
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Похож на'
+    )
+
+    def __str__(self):
+        return f'{self.post_id or self.comment_id}'
+
+
+class FingerprintBand(models.Model):
+    """Ключ полосы LSH подписи, по нему ищутся кандидаты в повторы.
+
+    Полосы удаляет Django вместе с подписью. Без ограничения внешнего
+    ключа SQLite очищает таблицу при полной перестройке сразу, а не
+    обходом миллионов строк.
+    """
+
+    class Meta:
+        indexes = (
+            # Кандидаты находятся по ключам без чтения таблицы.
+            models.Index(
+                fields=('key', 'fingerprint'),
+                name='fingerprint_band_key_idx'
+            ),
+        )
+
+    fingerprint = models.ForeignKey(
+        Fingerprint,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='bands',
+        verbose_name='Подпись'
+    )
+    key = models.BigIntegerField('Ключ')
+
+    def __str__(self):
+        return f'{self.fingerprint_id}: {self.key}'
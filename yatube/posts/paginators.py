@@ -0,0 +1,182 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу сортировки (keyset) без COUNT и OFFSET.
+
+    Страница выбирается непрозрачными курсорами `after`/`before`,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Номер страницы `page` поддерживается для старых ссылок: такая
+    страница читается через OFFSET, но тоже без подсчёта записей.
+
+    Объект страницы остаётся обычным `Page`, а курсоры соседних
+    страниц хранятся на пагинаторе: `next_cursor`, `previous_cursor`.
+    """
+
+    ORDERING = ('-pub_date', '-id')
+    # Дальше записей не бывает, а OFFSET больше 64 бит база не примет.
+    MAX_PAGE = 10 ** 6
+    # Целые значения курсора должны помещаться в столбец базы.
+    MAX_INT = 2 ** 63 - 1
+
+    def __init__(self, object_list, per_page,
+                 ordering=ORDERING, count=None):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._number = 1
+        self._has_next = False
+        if count is not None:
+            # Известное заранее значение подменяет COUNT-запрос.
+            self.__dict__['count'] = count
+
+    @property
+    def num_pages(self):
+        return self._number + 1 if self._has_next else self._number
+
+    def get_page(self, number=None, after=None, before=None):
+        after = self.decode_cursor(after)
+        before = self.decode_cursor(before)
+        if after is not None:
+            return self._cursor_page(after, forward=True)
+        if before is not None:
+            return self._cursor_page(before, forward=False)
+        try:
+            number = min(max(int(number), 1), self.MAX_PAGE)
+        except (TypeError, ValueError, OverflowError):
+            number = 1
+        return self._offset_page(number)
+
+    def page(self, number):
+        return self.get_page(number)
+
+    def iterate(self, after=None):
+        """Записи страницы после курсора `after` по одной, без списка.
+
+        Строки читаются из курсора базы порциями. Когда записи кончились,
+        `next_cursor` указывает на следующую страницу, если она есть.
+        """
+        values = self.decode_cursor(after)
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(
+                self._keyset_filter(values, forward=True)
+            )
+        rows = queryset.order_by(*self.ordering)[:self.per_page + 1]
+        last = None
+        for number, item in enumerate(rows.iterator()):
+            if number == self.per_page:
+                self.next_cursor = self.encode_cursor(last)
+                return
+            last = item
+            yield item
+
+    def encode_cursor(self, obj):
+        values = []
+        for name in self._field_names():
+            value = getattr(obj, self._attname(name))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        names = self._field_names()
+        if not isinstance(values, list) or len(values) != len(names):
+            return None
+        try:
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+        except (ValidationError, TypeError, ValueError, OverflowError):
+            # Подделанный курсор — не ошибка сервера, а первая страница.
+            return None
+        if any(
+            isinstance(value, int) and abs(value) > self.MAX_INT
+            for value in values
+        ):
+            return None
+        return values
+
+    def _field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _field(self, name):
+        # Сортировать можно и по аннотации запроса.
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def _attname(self, name):
+        if name in self.object_list.query.annotations:
+            return name
+        return self._field(name).attname
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def _keyset_filter(self, values, forward):
+        """Условие «строго после» (или «строго до») граничной записи."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _cursor_page(self, values, forward):
+        queryset = self.object_list.filter(
+            self._keyset_filter(values, forward)
+        )
+        if forward:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if forward:
+            return self._build_page(items, 2, has_more, True)
+        items.reverse()
+        return self._build_page(items, 2 if has_more else 1, True, has_more)
+
+    def _offset_page(self, number):
+        bottom = (number - 1) * self.per_page
+        queryset = self.object_list.order_by(*self.ordering)
+        items = list(queryset[bottom:bottom + self.per_page + 1])
+        has_next = len(items) > self.per_page
+        items = items[:self.per_page]
+        return self._build_page(items, number, has_next, number > 1)
+
+    def _build_page(self, items, number, has_next, has_previous):
+        self._number = number
+        self._has_next = has_next
+        if items and has_next:
+            self.next_cursor = self.encode_cursor(items[-1])
+        if items and has_previous:
+            self.previous_cursor = self.encode_cursor(items[0])
+        return Page(items, number, self)
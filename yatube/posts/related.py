@@ -0,0 +1,474 @@
+"""Похожие посты по векторам TF-IDF.
+
+Текст поста разбивается на русские и английские слова, стоп-слова
+отбрасываются, у остальных отсекается окончание. Термы хэшируются в
+`DIMENSIONS` номеров, поэтому словарь не хранится и каждый пост
+векторизуется сам по себе. В `PostVector` лежат частоты термов, а в
+`RelatedTerm` — число постов с каждым термом, от которого зависит
+IDF, и списки лидеров термов.
+
+`schedule` вызывается из `post_create` и `post_edit` и ставит отметку
+`RelatedRefresh`, удаление поста отмечает его так же. Команда
+`related_posts` векторизует отмеченные посты, меняет частоты на
+разницу старых и новых векторов и пересчитывает лидеров только их
+термов. Читаются векторы и термы лишь отмеченных постов, их новых
+соседей и постов, в чьих подборках они уже были, — их подборки и
+пересчитываются. Лидеры хранят веса без IDF, но нормы их векторов
+не пересчитываются при сдвиге частот, а место выбывшего лидера
+остаётся пустым. Всё это точно считает `--all`: она заново
+векторизует все тексты и считает частоты по всему корпусу.
+
+Соседи ищутся по спискам лидеров: у каждого терма остаются
+`CHAMPIONS` постов с наибольшим весом, а у поста учитываются
+`QUERY_TERMS` самых весомых термов. Сходство получается приближённым,
+зато работа на пост не растёт с размером корпуса.
+"""
+import re
+import zlib
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.page_cache import invalidate
+from .arrays import insert, ranges, sum_by_key, top
+from .cache_tags import RELATED, post_tag
+from .models import (
+    Post, PostVector, RelatedPost, RelatedRefresh, RelatedTerm
+)
+
+
+SIZE = settings.RELATED_POSTS_SIZE
+DIMENSIONS = 2 ** 20
+QUERY_TERMS = 16
+CHAMPIONS = 100
+# Ограничивает память: постов за один проход.
+POSTS_CHUNK = 5000
+# SQLite в Django 2.2 принимает не больше 999 параметров в запросе.
+BATCH_SIZE = 500
+MIN_LENGTH = 3
+# Номер строки `RelatedTerm` с числом всех постов, термы не меньше нуля.
+CORPUS = -1
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+# Окончания русских и английских слов; ленивая основа отсекает
+# самое длинное из подходящих.
+ENDINGS = (
+    'иями', 'ями', 'ами', 'его', 'ого', 'ему', 'ому', 'ыми', 'ими',
+    'иях', 'ях', 'ах', 'ия', 'ья', 'ие', 'ье', 'ий', 'ый', 'ой', 'ей',
+    'ем', 'им', 'ым', 'ом', 'ам', 'ям', 'ов', 'ев', 'ую', 'юю', 'ая',
+    'яя', 'ое', 'ее', 'ые', 'ть', 'ти', 'ет', 'ит', 'ют', 'ут', 'ат',
+    'ят', 'ал', 'ил', 'ла', 'ли', 'ло', 'а', 'е', 'и', 'й', 'о', 'у',
+    'ы', 'ь', 'ю', 'я',
+    'ing', 'ed', 'es', 'ly', 's',
+)
+ENDING_RE = re.compile(
+    rf'^(\w{{{MIN_LENGTH},}}?)(?:{"|".join(ENDINGS)})$'
+)
+STOP_WORDS = frozenset((
+    'что', 'как', 'все', 'она', 'так', 'его', 'только', 'мне', 'было',
+    'вот', 'меня', 'еще', 'нет', 'ему', 'теперь', 'когда', 'даже',
+    'вдруг', 'если', 'уже', 'или', 'быть', 'был', 'него', 'вас',
+    'нибудь', 'опять', 'вам', 'ведь', 'там', 'потом', 'себя', 'ничего',
+    'может', 'они', 'тут', 'где', 'есть', 'надо', 'ней', 'для', 'тебя',
+    'чем', 'была', 'сам', 'чтоб', 'без', 'будто', 'чего', 'раз',
+    'тоже', 'себе', 'под', 'будет', 'тогда', 'кто', 'этот', 'того',
+    'потому', 'этого', 'какой', 'совсем', 'ним', 'здесь', 'этом',
+    'один', 'почти', 'мой', 'тем', 'чтобы', 'нее', 'сейчас', 'были',
+    'куда', 'зачем', 'всех', 'никогда', 'можно', 'при', 'наконец',
+    'два', 'другой', 'хоть', 'после', 'над', 'больше', 'тот', 'через',
+    'эти', 'нас', 'про', 'всего', 'них', 'какая', 'много', 'разве',
+    'три', 'эту', 'моя', 'впрочем', 'хорошо', 'свою', 'этой', 'перед',
+    'иногда', 'лучше', 'чуть', 'том', 'нельзя', 'такой', 'более',
+    'всегда', 'конечно', 'всю', 'между', 'это', 'вы', 'мы',
+    'the', 'and', 'for', 'are', 'was', 'were', 'been', 'this', 'that',
+    'with', 'from', 'not', 'but', 'have', 'has', 'had', 'does', 'did',
+    'you', 'she', 'they', 'his', 'her', 'its', 'their', 'our', 'your',
+    'will', 'would', 'there', 'what', 'which', 'who', 'all', 'can',
+))
+
+
+def terms(text):
+    """Основы значимых слов текста."""
+    for word in WORD_RE.findall(text.lower().replace('ё', 'е')):
+        if len(word) < MIN_LENGTH or word in STOP_WORDS:
+            continue
+        match = ENDING_RE.match(word)
+        yield match.group(1) if match else word
+
+
+def vectorize(text):
+    """Номера термов текста по возрастанию и их частоты."""
+    hashes = np.fromiter(
+        (zlib.crc32(term.encode()) % DIMENSIONS for term in terms(text)),
+        dtype=np.uint32,
+    )
+    numbers, counts = np.unique(hashes, return_counts=True)
+    return numbers, np.minimum(counts, np.iinfo(np.uint16).max).astype(
+        np.uint16
+    )
+
+
+def schedule(post):
+    """Отмечает новый или изменённый пост, вектор посчитает `refresh`."""
+    RelatedRefresh.objects.create(post=post)
+
+
+def schedule_deleted(posts):
+    """Отмечает удаляемые посты `posts`, у которых есть векторы.
+
+    Вектор переживает удаление поста, чтобы пересчёт вычел его термы из
+    частот документов.
+    """
+    sql, params = PostVector.objects.filter(
+        post__in=posts
+    ).values('post_id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {RelatedRefresh._meta.db_table} (post_id) {sql}',
+            params,
+        )
+
+
+# Частоты документов `documents` и списки лидеров термов `numbers`
+# (по возрастанию): лидеры терма `term` — первичные ключи
+# `leaders[postings[term]:postings[term + 1]]` и их веса без IDF в тех же
+# отрезках `shares`. `total` — число всех постов с векторами.
+Terms = namedtuple(
+    'Terms', 'total numbers documents postings leaders shares'
+)
+
+
+def _idf(total, documents):
+    return np.log((1 + total) / (1 + documents)) + 1
+
+
+def _weights(pointers, counts, idf):
+    """Веса TF-IDF элементов строк, нормированные по строкам."""
+    size = len(pointers) - 1
+    rows = np.repeat(np.arange(size), np.diff(pointers))
+    weights = (1 + np.log(counts)) * idf
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=size))
+    return weights / norms[rows]
+
+
+def _champions(terms, post_ids, shares, size):
+    """Лидеры `size` термов из элементов с номерами термов `terms`."""
+    order = np.argsort(terms, kind='stable')
+    best = order[top(terms[order], shares[order], CHAMPIONS)]
+    postings = np.r_[0, np.cumsum(np.bincount(terms[best], minlength=size))]
+    return postings, post_ids[best], shares[best]
+
+
+class Index:
+    """Нормированные векторы TF-IDF постов и лидеры их термов.
+
+    Строки матрицы — посты по возрастанию первичных ключей `post_ids`,
+    элементы строки `row` лежат в `terms[pointers[row]:pointers[row + 1]]`,
+    термы — номера в `Terms.numbers`. Веса лидеров уже умножены на IDF.
+    """
+
+    def __init__(self, post_ids, pointers, numbers, counts, terms):
+        self.post_ids, self.pointers = post_ids, pointers
+        self.terms = np.searchsorted(terms.numbers, numbers)
+        idf = _idf(terms.total, terms.documents)
+        self.weights = _weights(pointers, counts, idf[self.terms])
+        self.postings, self.leaders = terms.postings, terms.leaders
+        self.leader_weights = terms.shares * np.repeat(
+            idf, np.diff(terms.postings)
+        )
+        self.width = 1 + max(
+            post_ids.max(initial=0), terms.leaders.max(initial=0)
+        )
+
+    def related(self):
+        """Соседи всех строк: посты, соседние посты и сходство."""
+        targets = np.arange(len(self.post_ids))
+        parts = [
+            self._related(chunk)
+            for chunk in np.split(
+                targets, np.arange(POSTS_CHUNK, len(targets), POSTS_CHUNK)
+            )
+        ]
+        return tuple(
+            np.concatenate([np.empty(0, dtype=dtype)] + [
+                part[column] for part in parts
+            ])
+            for column, dtype in enumerate((np.int64, np.int64, np.float64))
+        )
+
+    def _related(self, targets):
+        width = self.width
+        counts = self.pointers[targets + 1] - self.pointers[targets]
+        entries = ranges(self.pointers[targets], counts)
+        owners = np.repeat(np.arange(len(targets)), counts)
+        best = top(owners, self.weights[entries], QUERY_TERMS)
+        owners, entries = owners[best], entries[best]
+        numbers = self.terms[entries]
+        counts = self.postings[numbers + 1] - self.postings[numbers]
+        positions = ranges(self.postings[numbers], counts)
+        # Сам пост добавляется с оценкой -inf и после сложения
+        # отбрасывается.
+        keys, scores = sum_by_key(
+            np.r_[
+                np.repeat(owners, counts).astype(np.int64) * width
+                + self.leaders[positions],
+                np.arange(len(targets), dtype=np.int64) * width
+                + self.post_ids[targets],
+            ],
+            np.r_[
+                np.repeat(self.weights[entries], counts)
+                * self.leader_weights[positions],
+                np.full(len(targets), -np.inf),
+            ],
+        )
+        owners, neighbours = np.divmod(keys, width)
+        keep = scores > -np.inf
+        best = top(owners[keep], scores[keep], SIZE)
+        return (
+            self.post_ids[targets[owners[keep][best]]],
+            neighbours[keep][best],
+            scores[keep][best],
+        )
+
+
+def _arrays(rows):
+    """Массивы CSR из строк (первичный ключ, байты термов, байты частот)."""
+    sizes = np.array([len(row[1]) for row in rows], dtype=np.int64) // 4
+    return (
+        np.array([row[0] for row in rows], dtype=np.int64),
+        np.r_[0, np.cumsum(sizes)],
+        np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint32),
+        np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint16),
+    )
+
+
+def _vectors(post_ids=None):
+    """Сохранённые векторы постов `post_ids` или, без них, всех постов."""
+    queryset = PostVector.objects.order_by('post_id').values_list(
+        'post_id', 'terms', 'counts'
+    )
+    if post_ids is not None:
+        return _arrays(sorted(
+            row
+            for start in range(0, len(post_ids), BATCH_SIZE)
+            for row in queryset.filter(
+                post_id__in=post_ids[start:start + BATCH_SIZE]
+            )
+        ))
+    # Все векторы читаются одним запросом без экземпляров моделей.
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return _arrays(cursor.fetchall())
+
+
+def _read_terms(numbers):
+    """Сохранённые частоты и лидеры термов `numbers` (по возрастанию)."""
+    keys = [CORPUS] + numbers.tolist()
+    rows = {}
+    for start in range(0, len(keys), BATCH_SIZE):
+        rows.update(
+            (row[0], row[1:]) for row in RelatedTerm.objects.filter(
+                number__in=keys[start:start + BATCH_SIZE]
+            ).values_list('number', 'documents', 'posts', 'weights')
+        )
+    total = rows.pop(CORPUS, (0,))[0]
+    found = [rows.get(number, (0, b'', b'')) for number in keys[1:]]
+    return Terms(
+        total,
+        numbers,
+        np.array([row[0] for row in found], dtype=np.int64),
+        np.r_[0, np.cumsum(
+            np.array([len(row[1]) for row in found], dtype=np.int64) // 8
+        )],
+        np.frombuffer(b''.join(row[1] for row in found), dtype=np.int64),
+        np.frombuffer(b''.join(row[2] for row in found), dtype=np.float64),
+    )
+
+
+def _write_terms(terms):
+    """Заменяет строки `RelatedTerm` термов `terms` и число постов."""
+    keys = [CORPUS] + terms.numbers.tolist()
+    for start in range(0, len(keys), BATCH_SIZE):
+        RelatedTerm.objects.filter(
+            number__in=keys[start:start + BATCH_SIZE]
+        ).delete()
+    used = np.flatnonzero(terms.documents > 0)
+    starts, ends = terms.postings[used], terms.postings[used + 1]
+    insert(
+        RelatedTerm, ('number', 'documents', 'posts', 'weights'),
+        np.r_[CORPUS, terms.numbers[used].astype(np.int64)],
+        np.r_[terms.total, terms.documents[used]],
+        [b''] + [
+            terms.leaders[start:end].tobytes()
+            for start, end in zip(starts, ends)
+        ],
+        [b''] + [
+            terms.shares[start:end].tobytes()
+            for start, end in zip(starts, ends)
+        ],
+    )
+
+
+def _load(post_ids):
+    """Индекс сохранённых векторов постов `post_ids`."""
+    vectors = _vectors(post_ids)
+    return Index(*vectors, _read_terms(np.unique(vectors[2])))
+
+
+def vectorize_all():
+    """Заново векторизует тексты всех постов."""
+    PostVector.objects.all().delete()
+    posts = Post.objects.order_by().values_list('id', 'text')
+    post_ids, numbers, counts = [], [], []
+    for post_id, text in posts.iterator():
+        post_terms, post_counts = vectorize(text)
+        post_ids.append(post_id)
+        numbers.append(post_terms.tobytes())
+        counts.append(post_counts.tobytes())
+    insert(PostVector, ('post', 'terms', 'counts'), post_ids, numbers, counts)
+
+
+def _rebuild():
+    """Векторизует все посты и считает частоты и лидеров по корпусу."""
+    vectorize_all()
+    post_ids, pointers, numbers, counts = _vectors()
+    vocabulary, inverse = np.unique(numbers, return_inverse=True)
+    documents = np.bincount(inverse, minlength=len(vocabulary))
+    idf = _idf(len(post_ids), documents)[inverse]
+    rows = np.repeat(np.arange(len(post_ids)), np.diff(pointers))
+    shares = _weights(pointers, counts, idf) / idf
+    terms = Terms(
+        len(post_ids), vocabulary, documents, *_champions(
+            inverse, post_ids[rows], shares, len(vocabulary)
+        )
+    )
+    RelatedTerm.objects.all().delete()
+    _write_terms(terms)
+    return Index(post_ids, pointers, numbers, counts, terms)
+
+
+def _update(post_ids):
+    """Заменяет векторы постов `post_ids` и их вклад в `RelatedTerm`.
+
+    Частоты меняются на разницу старых и новых векторов, лидеры
+    пересчитываются только у их термов. Возвращает индекс новых
+    векторов; у удалённых постов их нет.
+    """
+    old_ids, old_pointers, old_numbers, _ = _vectors(post_ids)
+    texts = sorted(
+        row
+        for start in range(0, len(post_ids), BATCH_SIZE)
+        for row in Post.objects.filter(
+            id__in=post_ids[start:start + BATCH_SIZE]
+        ).values_list('id', 'text')
+    )
+    vectors = [vectorize(text) for _, text in texts]
+    new_ids, pointers, new_numbers, counts = _arrays([
+        (post_id, post_terms.tobytes(), post_counts.tobytes())
+        for (post_id, _), (post_terms, post_counts) in zip(texts, vectors)
+    ])
+    numbers = np.union1d(old_numbers, new_numbers)
+    terms = _read_terms(numbers)
+    new_terms = np.searchsorted(numbers, new_numbers)
+    documents = terms.documents + np.bincount(
+        new_terms, minlength=len(numbers)
+    ) - np.bincount(
+        np.searchsorted(numbers, old_numbers), minlength=len(numbers)
+    )
+    total = terms.total + len(new_ids) - len(old_ids)
+    idf = _idf(total, documents)[new_terms]
+    rows = np.repeat(np.arange(len(new_ids)), np.diff(pointers))
+    # Прежние веса постов `post_ids` заменяются новыми.
+    kept = ~np.isin(terms.leaders, post_ids)
+    old_terms = np.repeat(np.arange(len(numbers)), np.diff(terms.postings))
+    terms = Terms(total, numbers, documents, *_champions(
+        np.r_[old_terms[kept], new_terms],
+        np.r_[terms.leaders[kept], new_ids[rows]],
+        np.r_[terms.shares[kept], _weights(pointers, counts, idf) / idf],
+        len(numbers),
+    ))
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        PostVector.objects.filter(
+            post_id__in=post_ids[start:start + BATCH_SIZE]
+        ).delete()
+    insert(
+        PostVector, ('post', 'terms', 'counts'), new_ids,
+        [post_terms.tobytes() for post_terms, _ in vectors],
+        [post_counts.tobytes() for _, post_counts in vectors],
+    )
+    _write_terms(terms)
+    return Index(new_ids, pointers, new_numbers, counts, terms)
+
+
+def _listing(post_ids):
+    """Посты, в чьих подборках есть посты `post_ids`."""
+    listing = set()
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        listing.update(RelatedPost.objects.filter(
+            related_id__in=post_ids[start:start + BATCH_SIZE]
+        ).values_list('post_id', flat=True))
+    return listing
+
+
+def listing_tags(posts):
+    """Теги страниц постов, в чьих подборках есть посты `posts`.
+
+    Удаление поста каскадом убирает его из подборок, поэтому теги
+    собираются до удаления.
+    """
+    post_ids = RelatedPost.objects.filter(
+        related__in=posts
+    ).order_by().values_list('post_id', flat=True).distinct()
+    return [post_tag(post_id) for post_id in post_ids]
+
+
+def refresh(full=False):
+    """Пересчитывает похожие посты и возвращает число подборок.
+
+    Без `full` пересчитываются только отмеченные посты и те, чьи
+    подборки от них зависят.
+    """
+    last = RelatedRefresh.objects.order_by('-id').values_list(
+        'id', flat=True
+    ).first()
+    if last is None and not full:
+        return 0
+    # Частот ещё нет, например сразу после миграции.
+    full = full or not RelatedTerm.objects.filter(number=CORPUS).exists()
+    marks = RelatedRefresh.objects.filter(id__lte=last or 0)
+    marked = list(
+        marks.order_by().values_list('post_id', flat=True).distinct()
+    )
+    with transaction.atomic():
+        index = _rebuild() if full else _update(marked)
+    rows = index.related()
+    if not full:
+        # Новые соседи и прежние подборки с отмеченными постами тоже
+        # меняются.
+        others = np.setdiff1d(
+            np.union1d(rows[1], sorted(_listing(marked))), index.post_ids
+        )
+        rows = tuple(
+            np.r_[first, second] for first, second in zip(
+                rows, _load(others.tolist()).related()
+            )
+        )
+        post_ids = np.union1d(index.post_ids, others).tolist()
+    with transaction.atomic():
+        if full:
+            RelatedPost.objects.all().delete()
+        else:
+            for start in range(0, len(post_ids), BATCH_SIZE):
+                RelatedPost.objects.filter(
+                    post_id__in=post_ids[start:start + BATCH_SIZE]
+                ).delete()
+        insert(RelatedPost, ('post', 'related', 'score'), *rows)
+        marks.delete()
+    if full:
+        invalidate(RELATED)
+        return len(index.post_ids)
+    invalidate(*(post_tag(post_id) for post_id in post_ids))
+    return len(post_ids)
@@ -0,0 +1,156 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Тексты постов и комментариев проиндексированы во внешних таблицах
+FTS5 `posts_post_fts` и `posts_comment_fts`: они хранят только индекс,
+а сам текст читают из исходных таблиц. Индекс обновляют триггеры
+базы, поэтому его не обходят ни `bulk_create`, ни `update()`.
+
+Пересоздание таблицы миграцией на SQLite (ALTER через копию таблицы)
+удаляет её триггеры, поэтому после каждого `migrate` они ставятся
+заново (`install_triggers`). Ключи строк при копировании сохраняются,
+и сам индекс остаётся верным.
+
+Запрос пользователя не передаётся в FTS5 как есть: из него берутся
+только слова, слово от двух букв ищется как префикс («пост» найдёт
+«постами»), все слова должны встретиться. Результаты сортируются
+по bm25.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post
+
+
+TOKENIZE = 'unicode61 remove_diacritics 2'
+# Префиксы из двух и трёх букв индексируются отдельно, поиск по
+# коротким префиксам не перебирает весь словарь.
+PREFIX = '2 3'
+MAX_TERMS = 8
+# Однобуквенный префикс совпадает почти со всем словарём.
+MIN_PREFIX = 2
+WORD_RE = re.compile(r'\w+')
+
+INDEXED = (Post, Comment)
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def _create_table(model):
+    table = fts_table(model)
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"text, content='{model._meta.db_table}', content_rowid='id', "
+        f"tokenize='{TOKENIZE}', prefix='{PREFIX}')"
+    )
+
+
+def _triggers(model):
+    source, table = model._meta.db_table, fts_table(model)
+    insert = f'INSERT INTO {table}(rowid, text) VALUES (new.id, new.text);'
+    delete = (
+        f"INSERT INTO {table}({table}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text);"
+    )
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT '
+        f'ON {source} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE '
+        f'ON {source} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF text '
+        f'ON {source} BEGIN {delete} {insert} END',
+    )
+
+
+def install_triggers(cursor):
+    for model in INDEXED:
+        for statement in _triggers(model):
+            cursor.execute(statement)
+
+
+def create_index(cursor):
+    """Создаёт индексы, триггеры и заполняет индексы текущими данными."""
+    for model in INDEXED:
+        cursor.execute(_create_table(model))
+    install_triggers(cursor)
+    rebuild(cursor)
+
+
+def drop_index(cursor):
+    for model in INDEXED:
+        table = fts_table(model)
+        for action in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{action}')
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+def rebuild(cursor=None):
+    """Перечитывает индексы из исходных таблиц."""
+    if cursor is None:
+        with connection.cursor() as cursor:
+            return rebuild(cursor)
+    for model in INDEXED:
+        table = fts_table(model)
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Безопасное выражение MATCH из пользовательского запроса.
+
+    Пустая строка значит, что искать нечего.
+    """
+    words = WORD_RE.findall(query.lower())[:MAX_TERMS]
+    return ' '.join(
+        f'"{word}"*' if len(word) >= MIN_PREFIX else f'"{word}"'
+        for word in words
+    )
+
+
+def matching(model, expression):
+    """Подзапрос ключей строк `model`, подходящих под выражение."""
+    table = fts_table(model)
+    return RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (expression,)
+    )
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в `queryset` только строки, найденные по запросу."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(pk__in=matching(queryset.model, expression))
+
+
+def ranked_ids(model, query, limit, offset=0):
+    """Ключи найденных строк `model` от самых релевантных.
+
+    Сортировку и LIMIT выполняет сам FTS5, исходная таблица не читается.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    table = fts_table(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+            'ORDER BY rank LIMIT %s OFFSET %s',
+            (expression, limit, offset),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_posts(query, page_size, page=1):
+    """Страница найденных постов и признак следующей страницы.
+
+    Как и `CursorPaginator`, не считает общее число совпадений:
+    лишняя запись в выборке говорит, что есть следующая страница.
+    """
+    ids = ranked_ids(Post, query, page_size + 1, (page - 1) * page_size)
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts], has_next
@@ -0,0 +1,122 @@
+from django.db import connections
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from core.page_cache import invalidate, viewer_tag
+from users.models import Profile
+from . import following, related, search, timeline
+from .cache_tags import post_tag, profile_tag, tags_for_group, tags_for_post
+from .counters import bump
+from .models import Comment, Follow, Group, Post, SuggestionRefresh
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        bump(Group.objects.filter(pk=group_id), delta, 'posts_count')
+
+
+def invalidate_follow(follow):
+    following.forget(follow.user_id)
+    SuggestionRefresh.objects.create(user_id=follow.user_id)
+    invalidate(
+        profile_tag(follow.author.username),
+        profile_tag(follow.user.username),
+        viewer_tag(follow.user_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate(*tags_for_post(
+        instance, getattr(instance, '_loaded_group_id', None)
+    ))
+    if created:
+        bump(Profile.objects.filter(pk=instance.author_id), 1, 'posts_count')
+        bump_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+    elif hasattr(instance, '_loaded_group_id'):
+        if instance._loaded_group_id != instance.group_id:
+            bump_group(instance._loaded_group_id, -1)
+            bump_group(instance.group_id, 1)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    instance._listing_tags = related.listing_tags([instance.pk])
+    related.schedule_deleted([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump(Profile.objects.filter(pk=instance.author_id), -1, 'posts_count')
+    bump_group(instance.group_id, -1)
+    invalidate(
+        *tags_for_post(instance), *getattr(instance, '_listing_tags', ())
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate(*tags_for_group(
+        instance, getattr(instance, '_loaded_slug', None)
+    ))
+    instance._loaded_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления посты уже отвязаны от группы и не найдутся.
+    invalidate(*tags_for_group(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(Post.objects.filter(pk=instance.post_id), 1, 'comments_count')
+        invalidate(post_tag(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump(Post.objects.filter(pk=instance.post_id), -1, 'comments_count')
+    invalidate(post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(
+            Profile.objects.filter(pk=instance.author_id),
+            1, 'followers_count'
+        )
+        bump(Profile.objects.filter(pk=instance.user_id), 1, 'following_count')
+        timeline.backfill(instance)
+        invalidate_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump(Profile.objects.filter(pk=instance.author_id), -1, 'followers_count')
+    bump(Profile.objects.filter(pk=instance.user_id), -1, 'following_count')
+    timeline.prune(instance)
+    timeline.leave_pull(instance)
+    invalidate_follow(instance)
+
+
+@receiver(post_migrate)
+def search_triggers_restored(sender, using, **kwargs):
+    """Возвращает триггеры поиска, удалённые пересозданием таблиц."""
+    if sender.name != 'posts':
+        return
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    if all(search.fts_table(model) in tables for model in search.INDEXED):
+        with connection.cursor() as cursor:
+            search.install_triggers(cursor)
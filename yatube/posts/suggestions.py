@@ -0,0 +1,217 @@
+"""Рекомендации авторов по совместным подпискам.
+
+Граф подписок целиком читается в массивы NumPy. Сходство двух
+авторов — косинус между множествами их подписчиков: число общих
+подписчиков, делённое на корень из произведения размеров множеств.
+У каждого автора остаются `NEIGHBOURS` самых похожих, а оценка
+автора для пользователя — сумма его сходств с авторами, на которых
+пользователь уже подписан. В `AuthorSuggestion` пишутся `SIZE`
+лучших авторов, на которых пользователь ещё не подписан.
+
+Пары, подсчёт и отбор лучших делаются сортировками и `np.repeat`
+без циклов по строкам. Пользователь с тысячами подписок дал бы
+квадрат пар, поэтому в сходство идут только его последние
+`MAX_FOLLOWS` подписок.
+
+Сходство зависит от всего графа, поэтому граф читается при каждом
+запуске заново. Пересчитываются и записываются только подборки
+пользователей, отмеченных в `SuggestionRefresh`.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.page_cache import VIEWERS, invalidate, viewer_tag
+from .arrays import insert, ranges, sum_by_key, top
+from .models import AuthorSuggestion, Follow, SuggestionRefresh
+
+
+SIZE = settings.AUTHOR_SUGGESTIONS_SIZE
+NEIGHBOURS = settings.AUTHOR_SUGGESTIONS_NEIGHBOURS
+MAX_FOLLOWS = 100
+# Ограничивают память: пар совместных подписок и пользователей
+# за один проход.
+PAIRS_CHUNK = 2 ** 23
+USERS_CHUNK = 20000
+# SQLite в Django 2.2 принимает не больше 999 параметров в запросе.
+BATCH_SIZE = 500
+
+
+class Graph:
+    """Подписки в массивах, упорядоченных по пользователю.
+
+    Пользователи и авторы пронумерованы подряд, `user_ids` и
+    `author_ids` переводят номера обратно в первичные ключи.
+    Внутри пользователя подписки идут в порядке входных массивов.
+    """
+
+    def __init__(self, users, authors):
+        self.user_ids, users = np.unique(users, return_inverse=True)
+        self.author_ids, authors = np.unique(authors, return_inverse=True)
+        order = np.argsort(users, kind='stable')
+        self.users = users[order]
+        self.authors = authors[order]
+        self.degrees = np.bincount(self.users, minlength=len(self.user_ids))
+        self.starts = np.cumsum(self.degrees) - self.degrees
+
+    def _pairs(self, starts, counts):
+        """Ключи пар авторов a < b с общим подписчиком."""
+        width = len(self.author_ids)
+        # Сумма квадратов подписок — сколько пар даст каждый пользователь.
+        cost = np.cumsum(counts.astype(np.int64) ** 2)
+        bounds = np.unique(np.r_[
+            0,
+            np.searchsorted(
+                cost,
+                np.arange(PAIRS_CHUNK, cost[-1] if len(cost) else 0,
+                          PAIRS_CHUNK),
+                side='right',
+            ),
+            len(counts),
+        ])
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            chunk_starts, chunk_counts = starts[first:last], counts[first:last]
+            repeats = np.repeat(chunk_counts, chunk_counts)
+            left = np.repeat(ranges(chunk_starts, chunk_counts), repeats)
+            right = ranges(
+                np.repeat(chunk_starts, chunk_counts), repeats
+            )
+            a, b = self.authors[left], self.authors[right]
+            keep = a < b
+            yield a[keep].astype(np.int64) * width + b[keep]
+
+    def neighbours(self):
+        """Самые похожие авторы каждого автора.
+
+        Возвращает указатели начала строк автора, номера похожих
+        авторов и сходство, как в разреженной матрице CSR.
+        """
+        width = len(self.author_ids)
+        counts = np.minimum(self.degrees, MAX_FOLLOWS)
+        starts = self.starts + self.degrees - counts
+        followers = np.bincount(
+            self.authors[ranges(starts, counts)], minlength=width
+        )
+        keys, common = np.unique(
+            np.concatenate([
+                np.empty(0, dtype=np.int64), *self._pairs(starts, counts)
+            ]),
+            return_counts=True,
+        )
+        a, b = np.divmod(keys, width)
+        similarity = common / np.sqrt(
+            followers[a].astype(np.float64) * followers[b]
+        )
+        sources, targets = np.r_[a, b], np.r_[b, a]
+        similarity = np.r_[similarity, similarity]
+        order = np.argsort(sources, kind='stable')
+        sources, targets = sources[order], targets[order]
+        similarity = similarity[order]
+        best = top(sources, similarity, NEIGHBOURS)
+        pointers = np.r_[0, np.cumsum(
+            np.bincount(sources[best], minlength=width)
+        )]
+        return pointers, targets[best], similarity[best]
+
+    def suggestions(self, user_ids=None):
+        """Лучшие авторы для пользователей `user_ids` или для всех.
+
+        Возвращает первичные ключи пользователей и авторов и оценки.
+        Пользователи без подписок остаются без подборки.
+        """
+        if user_ids is None:
+            users = np.arange(len(self.user_ids))
+        else:
+            user_ids = np.asarray(user_ids, dtype=self.user_ids.dtype)
+            users = np.searchsorted(self.user_ids, user_ids)
+            found = users < len(self.user_ids)
+            found[found] = self.user_ids[users[found]] == user_ids[found]
+            users = users[found]
+        pointers, targets, similarity = self.neighbours()
+        parts = [
+            self._score(chunk, pointers, targets, similarity)
+            for chunk in np.split(
+                users, np.arange(USERS_CHUNK, len(users), USERS_CHUNK)
+            )
+        ]
+        return tuple(
+            np.concatenate([np.empty(0, dtype=dtype)] + [
+                part[column] for part in parts
+            ])
+            for column, dtype in enumerate((np.int64, np.int64, np.float64))
+        )
+
+    def _score(self, users, pointers, targets, similarity):
+        width = len(self.author_ids)
+        counts = self.degrees[users]
+        owners = np.repeat(np.arange(len(users)), counts)
+        followed = self.authors[ranges(self.starts[users], counts)]
+        counts = pointers[followed + 1] - pointers[followed]
+        positions = ranges(pointers[followed], counts)
+        # Уже знакомые авторы добавляются с оценкой -inf: сумма с ними
+        # тоже -inf, и после сложения они отбрасываются.
+        keys = np.r_[
+            np.repeat(owners, counts).astype(np.int64) * width
+            + targets[positions],
+            owners.astype(np.int64) * width + followed,
+        ]
+        weights = np.r_[
+            similarity[positions], np.full(len(followed), -np.inf)
+        ]
+        keys, scores = sum_by_key(keys, weights)
+        owners, candidates = np.divmod(keys, width)
+        user_ids = self.user_ids[users][owners]
+        author_ids = self.author_ids[candidates]
+        keep = (scores > -np.inf) & (user_ids != author_ids)
+        best = top(owners[keep], scores[keep], SIZE)
+        return (
+            user_ids[keep][best], author_ids[keep][best], scores[keep][best]
+        )
+
+
+def load_graph():
+    """Читает все подписки одним запросом, по порядку их появления."""
+    queryset = Follow.objects.order_by('id').values_list(
+        'user_id', 'author_id'
+    )
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        edges = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    return Graph(edges[:, 0], edges[:, 1])
+
+
+def refresh(full=False):
+    """Пересчитывает подборки и возвращает число пользователей.
+
+    Без `full` пересчитываются только пользователи с отметками.
+    Отметки, добавленные во время расчёта, остаются до следующего.
+    """
+    last = SuggestionRefresh.objects.order_by('-id').values_list(
+        'id', flat=True
+    ).first()
+    if last is None and not full:
+        return 0
+    marks = SuggestionRefresh.objects.filter(id__lte=last or 0)
+    user_ids = None if full else np.array(
+        marks.order_by().values_list('user_id', flat=True).distinct(),
+        dtype=np.int64,
+    )
+    graph = load_graph()
+    rows = graph.suggestions(user_ids)
+    with transaction.atomic():
+        if full:
+            AuthorSuggestion.objects.all().delete()
+        else:
+            for start in range(0, len(user_ids), BATCH_SIZE):
+                AuthorSuggestion.objects.filter(
+                    user_id__in=user_ids[start:start + BATCH_SIZE].tolist()
+                ).delete()
+        insert(AuthorSuggestion, ('user', 'author', 'score'), *rows)
+        marks.delete()
+        # Подборка показывается фрагментом, и ETag страниц должен смениться.
+        if full:
+            invalidate(VIEWERS)
+        else:
+            invalidate(*(viewer_tag(pk) for pk in user_ids.tolist()))
+    return len(graph.user_ids if full else user_ids)
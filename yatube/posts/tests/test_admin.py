@@ -0,0 +1,104 @@
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from users.models import Profile
+from ..counters import recount
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.old = Group.objects.create(title='Старая', slug='old')
+        self.new = Group.objects.create(title='Новая', slug='new')
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.old, text=f'Пост {number}'
+            )
+            for number in range(3)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Комментарий'
+        )
+        self.url = reverse('admin:posts_post_changelist')
+
+    def act(self, action, posts, **data):
+        return self.client.post(self.url, {
+            'action': action,
+            ACTION_CHECKBOX_NAME: [post.pk for post in posts],
+            'index': 0,
+            **data,
+        })
+
+    def test_changelist_queries_do_not_grow(self):
+        """Список постов не делает запросов на строку и полный COUNT."""
+        with self.assertNumQueries(10):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        for number in range(3, 10):
+            Post.objects.create(
+                author=User.objects.create_user(username=f'u{number}'),
+                text=f'Пост {number}',
+            )
+        with self.assertNumQueries(10):
+            self.client.get(self.url)
+
+    def test_date_hierarchy(self):
+        """Иерархия дат находит год и месяц постов."""
+        post = self.posts[0]
+        response = self.client.get(self.url, {
+            'pub_date__year': post.pub_date.year,
+        })
+        changelist = response.context['cl']
+        # Даты выбираются только иерархией, отдельного фильтра нет.
+        self.assertNotIn(
+            'pub_date',
+            [spec.field_path for spec in changelist.filter_specs
+             if hasattr(spec, 'field_path')],
+        )
+        months = changelist.queryset.dates('pub_date', 'month')
+        self.assertEqual(
+            [(month.year, month.month) for month in months],
+            [(post.pub_date.year, post.pub_date.month)]
+        )
+
+    def test_move_to_group(self):
+        """Перенос в группу одним запросом с пересчётом счётчиков."""
+        self.act('move_to_group', self.posts[:2], group=self.new.pk)
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertEqual(self.old.posts_count, 1)
+        self.assertEqual(self.new.posts_count, 2)
+        self.assertEqual(
+            Post.objects.filter(group=self.new).count(), 2
+        )
+        self.act('move_to_group', self.posts[:1], group='')
+        self.assertIsNone(Post.objects.get(pk=self.posts[0].pk).group)
+        self.assertEqual(recount(), 0)
+
+    def test_delete_set(self):
+        """Удаление после подтверждения убирает посты и всё связанное."""
+        response = self.act('delete_set', self.posts[:2])
+        self.assertTemplateUsed(
+            response, 'admin/posts/delete_set_confirmation.html'
+        )
+        self.assertEqual(Post.objects.count(), 3)
+        self.act('delete_set', self.posts[:2], post='yes')
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('post_id', flat=True)),
+            [self.posts[2].pk]
+        )
+        self.assertEqual(Profile.objects.get(pk=self.author.pk).posts_count, 1)
+        self.assertEqual(recount(), 0)
@@ -0,0 +1,183 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import api
+from ..models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+POSTS = 7
+LIMIT = 3
+
+
+class ApiTests(TestCase):
+    """JSON API лент с курсорами и выбором полей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(POSTS)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        if response.streaming:
+            return response, json.loads(b''.join(response.streaming_content))
+        return response, json.loads(response.content)
+
+    def walk(self, url, **params):
+        ids, after = [], ''
+        while True:
+            response, data = self.get(url, after=after, **params)
+            ids.extend(item['id'] for item in data['results'])
+            after = data['next']
+            if after is None:
+                return ids
+
+    def test_index_pages(self):
+        response, data = self.get(reverse('posts:api_index'), limit=LIMIT)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(data['results']), LIMIT)
+        self.assertEqual(data['results'][0], {
+            'id': self.posts[-1].pk,
+            'text': self.posts[-1].text,
+            'pub_date': data['results'][0]['pub_date'],
+            'author': 'author',
+            'group': None,
+            'image': None,
+            'comments_count': 0,
+        })
+        self.assertEqual(
+            self.walk(reverse('posts:api_index'), limit=LIMIT),
+            [post.pk for post in reversed(self.posts)],
+        )
+
+    def test_fields(self):
+        url = reverse('posts:api_index')
+        with CaptureQueriesContext(connection) as queries:
+            response, data = self.get(url, fields='id,group')
+        self.assertEqual(data['results'][0], {
+            'id': self.posts[-1].pk, 'group': None,
+        })
+        self.assertEqual(data['results'][1]['group'], 'group')
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('auth_user', sql)
+        response, data = self.get(url, fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', data['error'])
+
+    def test_group_and_profile(self):
+        self.assertEqual(
+            self.walk(
+                reverse('posts:api_group_posts', args=['group']), limit=LIMIT
+            ),
+            [post.pk for post in reversed(self.posts[1::2])],
+        )
+        self.assertEqual(
+            len(self.walk(
+                reverse('posts:api_profile_posts', args=['author'])
+            )),
+            POSTS,
+        )
+        self.assertEqual(
+            self.walk(reverse('posts:api_profile_posts', args=['reader'])),
+            [],
+        )
+        for url in (
+            reverse('posts:api_group_posts', args=['missing']),
+            reverse('posts:api_profile_posts', args=['missing']),
+            reverse('posts:api_post_detail', args=[0]),
+            reverse('posts:api_post_comments', args=[0]),
+            reverse('posts:api_post_detail', args=[api.MAX_ID + 1]),
+            reverse('posts:api_post_comments', args=[api.MAX_ID + 1]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url)[0].status_code, 404)
+
+    def test_bad_cursor(self):
+        url = reverse('posts:api_index')
+        for after in (
+            'не курсор',
+            base64.urlsafe_b64encode(b'[1,2]').decode(),
+            base64.urlsafe_b64encode(
+                b'["2022-01-01T00:00:00",1e999]'
+            ).decode(),
+        ):
+            with self.subTest(after=after):
+                response, data = self.get(url, after=after)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('after', data['error'])
+        response, data = self.get(
+            reverse('posts:api_post_comments', args=[self.posts[0].pk]),
+            after=base64.urlsafe_b64encode(b'[[],{}]').decode(),
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_follow(self):
+        url = reverse('posts:api_follow_posts')
+        self.assertEqual(self.get(url)[0].status_code, 401)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.walk(url), [])
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            self.walk(url, limit=LIMIT),
+            [post.pk for post in reversed(self.posts)],
+        )
+
+    def test_detail_and_comments(self):
+        post = self.posts[0]
+        response, data = self.get(
+            reverse('posts:api_post_detail', args=[post.pk]),
+            fields='text,author',
+        )
+        self.assertEqual(data, {'text': post.text, 'author': 'author'})
+        response, data = self.get(
+            reverse('posts:api_post_comments', args=[post.pk])
+        )
+        self.assertEqual(data['results'], [{
+            'id': post.comments.get().pk,
+            'post': post.pk,
+            'text': 'Комментарий',
+            'created': data['results'][0]['created'],
+            'author': 'reader',
+        }])
+        self.assertIsNone(data['next'])
+
+    def test_batch(self):
+        url = reverse('posts:api_posts_batch')
+        ids = [self.posts[2].pk, 10 ** 9, self.posts[0].pk, self.posts[2].pk]
+        response, data = self.get(
+            url, ids=','.join(map(str, ids)), fields='id'
+        )
+        self.assertEqual(data, {'results': [
+            {'id': self.posts[2].pk}, {'id': self.posts[0].pk},
+        ]})
+        for ids in ('1,x', '1,-2', '0', f'1,{api.MAX_ID + 1}'):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.get(url, ids=ids)[0].status_code, 400)
+        self.assertEqual(
+            self.get(url, ids=','.join(
+                map(str, range(1, api.MAX_LIMIT + 2))
+            ))[0].status_code,
+            400,
+        )
+        self.assertEqual(self.get(url)[1], {'results': []})
@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..management.commands import bench_views
+
+
+class BenchViewsTests(TestCase):
+    def test_requires_data(self):
+        """Без данных команда подсказывает запустить seed_data."""
+        with self.assertRaisesMessage(CommandError, 'seed_data'):
+            call_command('bench_views', stdout=StringIO())
+
+    def test_report_and_baseline(self):
+        """Отчёт пишется в JSON, повторный прогон сравнивается с ним."""
+        call_command(
+            'seed_data', users=10, groups=2, posts=30, comments=30,
+            follows=20, seed=3, stdout=StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command(
+                'bench_views', iterations=3, warmup=0, output=output,
+                stdout=StringIO(),
+            )
+            with open(output) as file:
+                report = json.load(file)
+            self.assertEqual(set(report['views']), {
+                'index', 'group_posts', 'profile', 'post_detail',
+                'follow_index',
+            })
+            for result in report['views'].values():
+                self.assertGreater(result['queries'], 0)
+                self.assertGreater(result['bytes'], 0)
+            stdout = StringIO()
+            call_command(
+                'bench_views', iterations=3, warmup=0, baseline=output,
+                views=['index'], stdout=stdout,
+            )
+            self.assertIn('index', stdout.getvalue())
+            self.assertIn('p95_ms', stdout.getvalue())
+
+    def test_percentile(self):
+        """Перцентили считаются и по одному замеру."""
+        self.assertEqual(bench_views.percentile([5], 99), 5)
+        self.assertEqual(bench_views.percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(bench_views.percentile(range(101), 95), 95)
+        call_command(
+            'seed_data', users=5, groups=1, posts=10, comments=10,
+            follows=5, seed=3, stdout=StringIO(),
+        )
+        stdout = StringIO()
+        call_command(
+            'bench_views', iterations=1, warmup=0, views=['index'],
+            stdout=stdout,
+        )
+        self.assertIn('p99', stdout.getvalue())
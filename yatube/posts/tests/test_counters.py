@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import Profile
+from ..models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_2',
+            description='Тестовое описание 2',
+        )
+
+    def refreshed(self, obj):
+        obj.refresh_from_db()
+        return obj
+
+    def test_write_paths_keep_counters(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.user.profile.posts_count, 0)
+        self.assertEqual(Profile.objects.get(pk=self.user.pk).posts_count, 1)
+        self.assertEqual(self.refreshed(self.group).posts_count, 1)
+        self.assertEqual(self.refreshed(post).comments_count, 1)
+        self.assertEqual(
+            Profile.objects.get(pk=self.user.pk).followers_count, 1
+        )
+        self.assertEqual(
+            Profile.objects.get(pk=self.reader.pk).following_count, 1
+        )
+
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.group2
+        post.save()
+        self.assertEqual(self.refreshed(self.group).posts_count, 0)
+        self.assertEqual(self.refreshed(self.group2).posts_count, 1)
+
+        Follow.objects.filter(user=self.reader).delete()
+        post.delete()
+        profile = Profile.objects.get(pk=self.user.pk)
+        self.assertEqual(profile.posts_count, 0)
+        self.assertEqual(profile.followers_count, 0)
+        self.assertEqual(self.refreshed(self.group2).posts_count, 0)
+
+    def test_missing_profile_created_on_read(self):
+        """Пользователь из фикстуры без профиля не ломает страницы."""
+        author = User.objects.create_user(username='fixture')
+        post = Post.objects.create(author=author, text='Пост из фикстуры')
+        Follow.objects.create(user=self.reader, author=author)
+        Profile.objects.filter(user=author).delete()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'fixture'})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Всего постов: 1')
+        profile = Profile.objects.get(user=author)
+        self.assertEqual(
+            (profile.posts_count, profile.followers_count), (1, 1)
+        )
+        Profile.objects.filter(user=author).delete()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Profile.objects.filter(user=author).exists())
+
+    def test_recount_command_repairs_counters(self):
+        """Команда recount_counters чинит разошедшиеся счётчики."""
+        Post.objects.bulk_create(
+            [
+                Post(author=self.user, text='Пост', group=self.group)
+                for _ in range(3)
+            ]
+        )
+        Profile.objects.filter(pk=self.reader.pk).delete()
+        out = StringIO()
+        call_command('recount_counters', stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(Profile.objects.get(pk=self.user.pk).posts_count, 3)
+        self.assertEqual(self.refreshed(self.group).posts_count, 3)
+        self.assertTrue(Profile.objects.filter(pk=self.reader.pk).exists())
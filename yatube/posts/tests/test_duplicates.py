@@ -0,0 +1,170 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import bulk, duplicates
+from ..models import Comment, Fingerprint, FingerprintBand, Post
+
+
+User = get_user_model()
+
+TEXT = (
+    'Сегодня утром мы поднялись на перевал, и облака лежали внизу, '
+    'как замёрзшее море. Спуск занял весь день.'
+)
+# Та же история с опечаткой и парой других слов.
+EDITED = (
+    'Сегодня утром мы поднялись на перевал, и облака лежали внизу '
+    'как замерзшее море! Спуск занял почти весь день.'
+)
+OTHER = (
+    'Рецепт простой: мука, яйца и молоко смешиваются до однородности, '
+    'тесто отдыхает полчаса, а блины жарятся на сухой сковороде.'
+)
+
+
+class DuplicatesTests(TestCase):
+    """Почти повторы постов и комментариев по подписям MinHash."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.client.force_login(self.user)
+
+    def create(self, text):
+        return self.client.post(reverse('posts:post_create'), {'text': text})
+
+    def test_signature(self):
+        def similarity(first, second):
+            return (
+                duplicates.Check(duplicates.POST, first).signature
+                == duplicates.Check(duplicates.POST, second).signature
+            ).mean()
+
+        self.assertGreaterEqual(similarity(TEXT, EDITED),
+                                duplicates.SIMILARITY)
+        self.assertLess(similarity(TEXT, OTHER), 0.2)
+        self.assertIsNone(
+            duplicates.Check(duplicates.POST, 'Спасибо!').signature
+        )
+
+    def test_create_rejects_own_repeat(self):
+        self.create(TEXT)
+        response = self.create(EDITED)
+        self.assertFormError(
+            response, 'form', 'text', duplicates.REPEAT_ERROR
+        )
+        self.assertEqual(Post.objects.count(), 1)
+        fingerprint = Fingerprint.objects.get()
+        self.assertIsNone(fingerprint.duplicate_of)
+        self.assertEqual(fingerprint.bands.count(), duplicates.BANDS)
+
+    def test_own_repeat_among_many_candidates(self):
+        """Свой повтор находится и среди множества слабых кандидатов."""
+        key = duplicates.Check(duplicates.POST, TEXT).keys[0]
+        signature = duplicates.Check(
+            duplicates.POST, OTHER
+        ).signature.astype('<u4').tobytes()
+        for _ in range(duplicates.CANDIDATES + 10):
+            fingerprint = Fingerprint.objects.create(
+                author=self.other, signature=signature,
+                post=Post.objects.create(author=self.other, text=OTHER),
+            )
+            FingerprintBand.objects.create(fingerprint=fingerprint, key=key)
+        self.create(TEXT)
+        response = self.create(EDITED)
+        self.assertFormError(
+            response, 'form', 'text', duplicates.REPEAT_ERROR
+        )
+
+    def test_create_flags_others_repeat(self):
+        self.create(TEXT)
+        self.create(OTHER)
+        self.client.force_login(self.other)
+        self.create(EDITED)
+        original = Post.objects.get(text=TEXT)
+        post = Post.objects.get(author=self.other)
+        self.assertEqual(
+            post.fingerprint.duplicate_of, original.fingerprint
+        )
+        self.assertIsNone(
+            Post.objects.get(text=OTHER).fingerprint.duplicate_of
+        )
+
+    def test_edit(self):
+        self.create(TEXT)
+        self.create(OTHER)
+        post = Post.objects.get(text=TEXT)
+        url = reverse('posts:post_edit', args=[post.pk])
+        # Правка своего поста не считается повтором его самого.
+        self.client.post(url, {'text': EDITED})
+        post.refresh_from_db()
+        self.assertEqual(post.text, EDITED)
+        response = self.client.post(url, {'text': OTHER + ' Приятного!'})
+        self.assertFormError(
+            response, 'form', 'text', duplicates.REPEAT_ERROR
+        )
+        self.client.post(url, {'text': 'Короткий текст'})
+        self.assertFalse(Fingerprint.objects.filter(post=post).exists())
+        self.assertEqual(FingerprintBand.objects.count(), duplicates.BANDS)
+
+    def test_comment(self):
+        post = Post.objects.create(author=self.other, text='Пост')
+        url = reverse('posts:add_comment', args=[post.pk])
+        self.client.post(url, {'text': TEXT})
+        self.client.post(url, {'text': EDITED})
+        self.client.post(url, {'text': 'Спасибо!'})
+        self.client.post(url, {'text': 'Спасибо!'})
+        self.assertEqual(
+            list(post.comments.order_by('id').values_list('text', flat=True)),
+            [TEXT, 'Спасибо!', 'Спасибо!'],
+        )
+        # Комментарий не похож на пост с тем же текстом.
+        self.assertEqual(self.create(TEXT).status_code, 302)
+
+    def test_delete(self):
+        self.create(TEXT)
+        self.client.force_login(self.other)
+        self.create(EDITED)
+        bulk.delete_posts(Post.objects.filter(author=self.user))
+        self.assertIsNone(Fingerprint.objects.get().duplicate_of)
+        self.assertEqual(FingerprintBand.objects.count(), duplicates.BANDS)
+
+    def test_build(self):
+        self.create(TEXT)
+        post = Post.objects.create(author=self.user, text=EDITED)
+        Post.objects.create(author=self.other, text=OTHER)
+        comment = Comment.objects.create(
+            post=post, author=self.other, text=TEXT
+        )
+        call_command('build_fingerprints', stdout=StringIO())
+        original = Post.objects.get(text=TEXT).fingerprint
+        self.assertEqual(Fingerprint.objects.count(), 4)
+        self.assertEqual(
+            Fingerprint.objects.get(post=post).duplicate_of, original
+        )
+        self.assertIsNone(
+            Fingerprint.objects.get(comment=comment).duplicate_of
+        )
+        self.assertEqual(
+            FingerprintBand.objects.count(), 4 * duplicates.BANDS
+        )
+        # Подписи и ключи совпадают с теми, что считаются при записи.
+        check = duplicates.Check(duplicates.POST, TEXT)
+        self.assertEqual(bytes(original.signature), check.signature.tobytes())
+        self.assertEqual(
+            sorted(original.bands.values_list('key', flat=True)),
+            sorted(check.keys),
+        )
+        # Новый почти повтор находит подпись, записанную командой.
+        self.client.force_login(self.other)
+        response = self.client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': EDITED}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(post.comments.count(), 1)
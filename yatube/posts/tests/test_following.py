@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import following
+from ..models import Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class FollowButtonsTests(TestCase):
+    """Кнопки подписки в лентах не делают запроса на каждый пост."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(settings.POST_PER_PAGE)
+        ]
+        for author in self.authors:
+            Post.objects.create(author=author, group=self.group, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.client.force_login(self.reader)
+
+    def follow_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [
+            query for query in queries.captured_queries
+            if 'FROM "posts_follow"' in query['sql']
+        ]
+
+    def test_one_query_per_page(self):
+        for url in (
+            reverse('posts:main_page'),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ):
+            with self.subTest(url=url):
+                cache.clear()
+                response, queries = self.follow_queries(url)
+                self.assertEqual(len(queries), 1)
+                self.assertContains(response, 'Отписаться', count=1)
+                self.assertContains(
+                    response, 'Подписаться', count=len(self.authors) - 1
+                )
+                # Множество подписок уже в кэше.
+                response, queries = self.follow_queries(url)
+                self.assertEqual(queries, [])
+
+    def test_follow_and_unfollow_refresh_buttons(self):
+        url = reverse('posts:main_page')
+        author = self.authors[1]
+        self.client.get(url)
+        self.client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+        response = self.client.get(url)
+        self.assertContains(response, 'Отписаться', count=2)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[author.username])
+        )
+        response = self.client.get(url)
+        self.assertContains(response, 'Отписаться', count=1)
+
+    def test_guest_sees_no_buttons(self):
+        self.client.logout()
+        response, queries = self.follow_queries(reverse('posts:main_page'))
+        self.assertEqual(queries, [])
+        self.assertNotContains(response, 'Подписаться')
+
+
+class FollowingCacheCommitTests(TransactionTestCase):
+    """Кэш подписок сбрасывается и после коммита подписки."""
+
+    def test_stale_set_cached_before_commit_is_dropped(self):
+        cache.clear()
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        key = following.FOLLOWING_KEY.format(reader.pk)
+        with transaction.atomic():
+            Follow.objects.create(user=reader, author=author)
+            # Параллельный запрос ещё видит базу без подписки.
+            cache.set(key, frozenset(), timeout=None)
+        self.assertIsNone(cache.get(key))
@@ -2,11 +2,16 @@ import shutil
 import tempfile
 from datetime import datetime
 from http import HTTPStatus
+from io import BytesIO, StringIO
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from .. import images, thumbnails
 from ..models import Post, Group, Follow
 
 
@@ -89,6 +94,127 @@ class TaskCreateFormTests(TestCase):
         self.assertEqual(test_post.author.username, form_data['author'])
         self.assertEqual(test_post.group.id, form_data['group'])
         self.assertEqual(test_post.image, 'posts/small.gif')
+        self.assertEqual(
+            (test_post.image_width, test_post.image_height), (2, 1)
+        )
+
+    def test_uploaded_image_ingested(self):
+        """Картинка уменьшается, поворачивается и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (images.MAX_SIZE * 2, 100), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Снимок с телефона',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+                ),
+            },
+        )
+        post = Post.objects.get(text='Снимок с телефона')
+        self.assertEqual(
+            (post.image_width, post.image_height), (50, images.MAX_SIZE)
+        )
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
+        )
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, images.MAX_SIZE))
+            self.assertNotIn('exif', stored.info)
+        # Сжатые варианты нужны только миниатюрам, см. thumbnails.
+        name = post.image.name.split('/')[-1]
+        self.assertEqual(
+            [
+                file for file in post.image.storage.listdir('posts')[1]
+                if file.startswith(name)
+            ],
+            [name],
+        )
+
+    def test_read_only_format_stored_untouched(self):
+        """Формат, который Pillow не записывает, сохраняется как есть."""
+        xpm = (
+            b'/* XPM */\n'
+            b'static char *image[] = {\n'
+            b'"2 1 1 1",\n'
+            b'"a c #FF0000",\n'
+            b'"aa"\n'
+            b'};\n'
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Картинка XPM',
+                'image': SimpleUploadedFile(
+                    'image.xpm', xpm, content_type='image/x-xpixmap'
+                ),
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        post = Post.objects.get(text='Картинка XPM')
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        with post.image.open('rb') as stored:
+            self.assertEqual(stored.read(), xpm)
+
+    def test_generate_thumbnails(self):
+        """Миниатюры создаются заранее и находятся тегом без оригинала."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            ),
+            content_type='image/gif'
+        )
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=uploaded
+        )
+        name, width, height, placeholder = thumbnails.generate(
+            post.image.name
+        )
+        self.assertEqual((name, width, height), (post.image.name, 2, 1))
+        self.assertTrue(placeholder.startswith('data:image/png;base64,'))
+        for geometry, options in thumbnails.PRESETS:
+            thumbnail = get_thumbnail(post.image.name, geometry, **options)
+            self.assertTrue(thumbnail.storage.exists(thumbnail.name))
+
+    def test_warm_thumbnails_skips_broken_images(self):
+        """Битая картинка не прерывает обработку остальных."""
+        broken = Post.objects.create(
+            text='Битая картинка', author=self.user,
+            image=SimpleUploadedFile('broken.gif', b'not an image'),
+        )
+        post = Post.objects.create(
+            text='Целая картинка', author=self.user,
+            image=SimpleUploadedFile(
+                'whole.gif',
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B',
+            ),
+        )
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'warm_thumbnails', workers=1, stdout=stdout, stderr=stderr
+        )
+        post.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertIsNone(broken.image_width)
+        self.assertIn(broken.image.name, stderr.getvalue())
+        self.assertIn('Пропущено картинок с ошибками: 1', stdout.getvalue())
 
     def test_post_edit(self):
         """Валидная форма изменяет запись в Post."""
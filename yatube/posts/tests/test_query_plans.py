@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+POSTS = settings.POST_PER_PAGE + 5
+COMMENTS = settings.COMMENTS_PER_PAGE + 5
+
+
+class QueryPlanTests(TestCase):
+    """Ленты читаются по индексу: без полного прохода и сортировки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = None
+        for number in range(POSTS):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Текст {number}')
+            for number in range(COMMENTS)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def plans(self, url, table):
+        """Планы запросов к `table` на первой и следующей странице."""
+        plans = []
+        response = self.client.get(url)
+        paginator = response.context['page_obj'].paginator
+        for page in (url, f'{url}?after={paginator.next_cursor}'):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(page)
+            for query in queries.captured_queries:
+                if f'FROM "{table}"' not in query['sql']:
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                    plans.append(' | '.join(
+                        row[-1] for row in cursor.fetchall()
+                    ))
+        self.assertTrue(plans)
+        return plans
+
+    def assertIndexOnly(self, plans, index):
+        for plan in plans:
+            with self.subTest(plan=plan):
+                self.assertIn(f'INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotRegex(plan, r'SCAN \w+( |$)(?!USING)')
+
+    def test_feeds(self):
+        index = connection.introspection.get_constraints(
+            connection.cursor(), Post._meta.db_table
+        )
+        pub_date_index = next(
+            name for name, constraint in index.items()
+            if constraint['columns'] == ['pub_date']
+        )
+        feeds = (
+            (reverse('posts:main_page'), 'posts_post', pub_date_index),
+            (
+                reverse('posts:group_list', args=[self.group.slug]),
+                'posts_post', 'post_group_pub_date_idx',
+            ),
+            (
+                reverse('posts:profile', args=[self.author.username]),
+                'posts_post', 'post_author_pub_date_idx',
+            ),
+            (
+                reverse('posts:follow_index'),
+                'posts_post', 'timeline_user_feed_idx',
+            ),
+        )
+        for url, table, index in feeds:
+            with self.subTest(url=url):
+                self.assertIndexOnly(self.plans(url, table), index)
+
+    def test_comments(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        cursor = response.context['comments'].paginator.next_cursor
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'after': cursor})
+        sql = next(
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_comment"' in query['sql']
+        )
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' | '.join(row[-1] for row in db_cursor.fetchall())
+        self.assertIndexOnly([plan], 'comment_post_created_idx')
+
+    def test_follow_unique(self):
+        """Повторная подписка запрещена индексом."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.author)
+        follow_check = Follow.objects.filter(
+            user=self.reader, author=self.author
+        ).exists
+        with CaptureQueriesContext(connection) as queries:
+            follow_check()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN QUERY PLAN {queries.captured_queries[0]["sql"]}'
+            )
+            plan = ' | '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('COVERING INDEX', plan)
+        self.assertIn('user_id=? AND author_id=?', plan)
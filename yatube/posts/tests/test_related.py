@@ -0,0 +1,167 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.page_cache import tag_versions
+
+from .. import bulk, related
+from ..cache_tags import post_tag
+from ..models import (
+    Post, PostVector, RelatedPost, RelatedRefresh, RelatedTerm
+)
+
+
+User = get_user_model()
+
+TEXTS = (
+    'Мой кот любит спать на тёплом подоконнике',
+    'Коты спят на подоконнике весь день',
+    'Ракета стартовала с космодрома ночью',
+    'Rockets launched from the cosmodrome at night',
+)
+
+
+class RelatedPostsTests(TestCase):
+    """Похожие посты по векторам TF-IDF."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.client.force_login(self.user)
+        for text in TEXTS:
+            self.client.post(reverse('posts:post_create'), {'text': text})
+        self.posts = list(Post.objects.order_by('pk'))
+
+    def related_texts(self, post):
+        return list(RelatedPost.objects.filter(post=post).order_by(
+            '-score'
+        ).values_list('related__text', flat=True))
+
+    def test_terms(self):
+        self.assertEqual(
+            list(related.terms('Коты и кошки: котами, КОТ! Ёлки, ёлка')),
+            ['кот', 'кошк', 'кот', 'кот', 'елк', 'елк'],
+        )
+        self.assertEqual(
+            list(related.terms('Posted posts about the rockets')),
+            ['post', 'post', 'about', 'rocket'],
+        )
+
+    def test_create_marks_post(self):
+        self.assertEqual(RelatedRefresh.objects.count(), len(TEXTS))
+        related.refresh()
+        self.assertEqual(PostVector.objects.count(), len(TEXTS))
+
+    def test_refresh(self):
+        self.assertEqual(related.refresh(), len(TEXTS))
+        self.assertFalse(RelatedRefresh.objects.exists())
+        self.assertEqual(self.related_texts(self.posts[0]), [TEXTS[1]])
+        self.assertEqual(self.related_texts(self.posts[2]), [])
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.posts[0].pk])
+        )
+        self.assertContains(response, 'Похожие посты')
+        self.assertContains(
+            response, reverse('posts:post_detail', args=[self.posts[1].pk])
+        )
+        # Правка текста пересчитывает и пост, и подборки с ним.
+        self.client.post(
+            reverse('posts:post_edit', args=[self.posts[1].pk]),
+            {'text': 'Ночью ракета ушла с космодрома'},
+        )
+        self.assertEqual(related.refresh(), 3)
+        self.assertEqual(self.related_texts(self.posts[0]), [])
+        self.assertEqual(
+            self.related_texts(self.posts[2]),
+            ['Ночью ракета ушла с космодрома'],
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.posts[0].pk])
+        )
+        self.assertNotContains(response, 'Похожие посты')
+
+    def test_full_refresh(self):
+        Post.objects.create(
+            author=self.user, text='Кот спит на подоконнике'
+        )
+        self.assertEqual(related.refresh(full=True), len(TEXTS) + 1)
+        self.assertEqual(PostVector.objects.count(), len(TEXTS) + 1)
+        self.assertEqual(
+            self.related_texts(self.posts[1]),
+            ['Кот спит на подоконнике', TEXTS[0]],
+        )
+
+    def test_full_refresh_bumps_one_tag(self):
+        """Полный пересчёт сбрасывает общий тег, а не тег каждого поста."""
+        related.refresh()
+        url = reverse('posts:post_detail', args=[self.posts[2].pk])
+        self.assertNotContains(self.client.get(url), 'Похожие посты')
+        Post.objects.create(
+            author=self.user, text='Ракета ушла с космодрома ночью'
+        )
+        tags = [post_tag(post.pk) for post in self.posts]
+        versions = tag_versions(tags)
+        related.refresh(full=True)
+        self.assertEqual(tag_versions(tags), versions)
+        self.assertContains(self.client.get(url), 'Похожие посты')
+
+    def test_delete_invalidates_listings(self):
+        """Удалённый пост пропадает из закэшированных подборок."""
+        other = User.objects.create_user(username='other')
+        deleted = [
+            Post.objects.create(author=other, text=text) for text in (
+                'Кот любит спать весь день на подоконнике',
+                'Мой кот спит на тёплом подоконнике',
+            )
+        ]
+        related.refresh(full=True)
+        url = reverse('posts:post_detail', args=[self.posts[0].pk])
+        for post, delete in zip(deleted, (
+            lambda post: post.delete(),
+            lambda post: bulk.delete_posts(Post.objects.filter(pk=post.pk)),
+        )):
+            link = reverse('posts:post_detail', args=[post.pk])
+            self.assertContains(self.client.get(url), link)
+            delete(post)
+            self.assertNotContains(self.client.get(url), link)
+
+    def terms(self):
+        return {
+            number: (documents, bytes(posts), bytes(weights))
+            for number, documents, posts, weights
+            in RelatedTerm.objects.values_list(
+                'number', 'documents', 'posts', 'weights'
+            )
+        }
+
+    def test_incremental_terms(self):
+        """Частоты и лидеры меняются на разницу векторов, как при
+        полном пересчёте."""
+        related.refresh()
+        self.assertEqual(
+            RelatedTerm.objects.get(number=related.CORPUS).documents,
+            len(TEXTS),
+        )
+        self.client.post(
+            reverse('posts:post_edit', args=[self.posts[1].pk]),
+            {'text': 'Ночью ракета ушла с космодрома'},
+        )
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Кот спит весь день'}
+        )
+        self.posts[2].delete()
+        bulk.delete_posts(Post.objects.filter(pk=self.posts[3].pk))
+        self.assertEqual(PostVector.objects.count(), len(TEXTS))
+        related.refresh()
+        self.assertEqual(PostVector.objects.count(), len(TEXTS) - 1)
+        self.assertEqual(
+            RelatedTerm.objects.get(number=related.CORPUS).documents,
+            len(TEXTS) - 1,
+        )
+        incremental = self.terms()
+        related.refresh(full=True)
+        self.assertEqual(incremental.keys(), self.terms().keys())
+        for number, (documents, posts, _) in self.terms().items():
+            self.assertEqual(incremental[number][0], documents)
+            self.assertEqual(incremental[number][1], posts)
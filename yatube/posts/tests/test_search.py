@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..search import filter_queryset, match_expression, search_posts
+
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.rare = Post.objects.create(
+            author=self.user, text='Ёжик в тумане и туманная долина'
+        )
+        self.often = Post.objects.create(
+            author=self.user, text='Туман, туман, туман над рекой'
+        )
+        Post.objects.create(author=self.user, text='Солнечный день')
+
+    def test_match_expression(self):
+        """Из запроса берутся только слова, синтаксис FTS5 не проходит."""
+        self.assertEqual(match_expression('туман* OR "река"'),
+                         '"туман"* "or"* "река"*')
+        self.assertEqual(match_expression(' ;-) '), '')
+
+    def test_ranked_prefix_search(self):
+        """Слова ищутся по префиксу, частые совпадения выше."""
+        posts, has_next = search_posts('туман', 10)
+        self.assertEqual(posts, [self.often, self.rare])
+        self.assertFalse(has_next)
+        posts, has_next = search_posts('туман', 1)
+        self.assertEqual(posts, [self.often])
+        self.assertTrue(has_next)
+        self.assertEqual(search_posts('ёжик туман', 10)[0], [self.rare])
+        self.assertEqual(search_posts('!!!', 10)[0], [])
+
+    def test_index_follows_changes(self):
+        """Правка, удаление и массовое обновление сразу видны в поиске."""
+        self.rare.text = 'Про лошадку'
+        self.rare.save()
+        self.assertEqual(search_posts('ёжик', 10)[0], [])
+        self.assertEqual(search_posts('лошадку', 10)[0], [self.rare])
+        Post.objects.filter(pk=self.rare.pk).update(text='Облако')
+        self.assertEqual(search_posts('облако', 10)[0], [self.rare])
+        self.often.delete()
+        self.assertEqual(search_posts('туман', 10)[0], [])
+        comment = Comment.objects.create(
+            post=self.rare, author=self.user, text='Отличная лошадка'
+        )
+        self.assertEqual(
+            list(filter_queryset(Comment.objects.all(), 'лошадк')),
+            [comment]
+        )
+
+    def test_search_page_and_admin(self):
+        """Публичный поиск и поиск в админке используют индекс."""
+        response = Client().get(reverse('posts:post_search'), {'q': 'туман'})
+        self.assertEqual(list(response.context['posts']),
+                         [self.often, self.rare])
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'солнечн'}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [Post.objects.get(text='Солнечный день').pk]
+        )
+
+    def test_search_huge_page(self):
+        """Номер страницы за пределами OFFSET базы даёт пустую страницу."""
+        response = Client().get(
+            reverse('posts:post_search'), {'q': 'туман', 'page': 10 ** 20}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['posts']), [])
+        self.assertFalse(response.context['has_next'])
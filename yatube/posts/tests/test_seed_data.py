@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from users.models import Profile
+from ..counters import recount
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..timeline import BACKFILL_SIZE
+
+
+User = get_user_model()
+
+
+class SeedDataTests(TestCase):
+    def seed(self):
+        call_command(
+            'seed_data', users=30, groups=3, posts=200, comments=300,
+            follows=60, seed=7, stdout=StringIO(),
+        )
+
+    def test_seed_data(self):
+        """Данные загружаются со счётчиками и лентами."""
+        self.seed()
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Profile.objects.count(), 30)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists()
+        )
+        # Счётчики уже согласованы, чинить нечего.
+        self.assertEqual(recount(), 0)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ).count(),
+            min(
+                Post.objects.filter(author_id=follow.author_id).count(),
+                BACKFILL_SIZE,
+            )
+        )
+
+    def test_same_seed_same_data(self):
+        """Одинаковый seed на пустой базе даёт одинаковые данные."""
+        def snapshot():
+            return list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug'
+            ))
+
+        self.seed()
+        first = snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(snapshot(), first)
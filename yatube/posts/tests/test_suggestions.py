@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.page_cache import tag_versions, viewer_tag
+from .. import suggestions
+from ..models import AuthorSuggestion, Follow, SuggestionRefresh
+
+
+User = get_user_model()
+
+
+class SuggestionsTests(TestCase):
+    """Рекомендации авторов по совместным подпискам."""
+
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'fan1', 'fan2', 'leo', 'anna', 'olga')
+        }
+        for user, author in (
+            ('fan1', 'leo'), ('fan1', 'anna'), ('fan1', 'reader'),
+            ('fan2', 'leo'), ('fan2', 'anna'), ('fan2', 'olga'),
+            ('reader', 'leo'),
+        ):
+            Follow.objects.create(
+                user=self.users[user], author=self.users[author]
+            )
+
+    def suggested(self, name):
+        return list(AuthorSuggestion.objects.filter(
+            user=self.users[name]
+        ).order_by('-score').values_list('author__username', flat=True))
+
+    def test_graph(self):
+        users, authors, scores = suggestions.Graph(
+            [1, 1, 2, 2, 3, 2], [10, 11, 10, 11, 10, 5]
+        ).suggestions([3, 4])
+        self.assertEqual(users.tolist(), [3, 3])
+        self.assertEqual(authors.tolist(), [11, 5])
+        self.assertAlmostEqual(scores[0], 2 / (3 * 2) ** 0.5)
+        self.assertAlmostEqual(scores[1], 1 / 3 ** 0.5)
+
+    def test_refresh(self):
+        self.assertEqual(suggestions.refresh(), 3)
+        self.assertFalse(SuggestionRefresh.objects.exists())
+        # Сам пользователь и его авторы не предлагаются.
+        self.assertEqual(self.suggested('reader'), ['anna', 'olga'])
+        self.assertEqual(self.suggested('fan1'), ['olga'])
+        self.assertEqual(suggestions.refresh(), 0)
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['anna']
+        )
+        self.assertEqual(suggestions.refresh(), 1)
+        self.assertEqual(self.suggested('reader'), ['olga'])
+        Follow.objects.filter(user=self.users['reader']).delete()
+        self.assertEqual(suggestions.refresh(), 1)
+        self.assertEqual(self.suggested('reader'), [])
+        self.assertEqual(suggestions.refresh(full=True), 2)
+
+    def test_follow_page_sidebar(self):
+        suggestions.refresh()
+        self.client.force_login(self.users['reader'])
+        url = reverse('posts:follow_index')
+        response = self.client.get(url)
+        self.assertEqual(
+            [
+                suggestion.author.username
+                for suggestion in response.context['suggestions']
+            ],
+            ['anna', 'olga'],
+        )
+        self.client.get(reverse('posts:profile_follow', args=['anna']))
+        response = self.client.get(url)
+        self.assertEqual(
+            [
+                suggestion.author.username
+                for suggestion in response.context['suggestions']
+            ],
+            ['olga'],
+        )
+
+    def test_full_refresh_bumps_one_tag(self):
+        """Полный пересчёт сбрасывает общий тег, а не тег каждого
+        пользователя, и ETag страниц всё равно меняется."""
+        suggestions.refresh()
+        self.client.force_login(self.users['reader'])
+        url = reverse('posts:main_page')
+        etag = self.client.get(url)['ETag']
+        tags = [viewer_tag(user.pk) for user in self.users.values()]
+        versions = tag_versions(tags)
+        suggestions.refresh(full=True)
+        self.assertEqual(tag_versions(tags), versions)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
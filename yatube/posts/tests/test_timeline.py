@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry
+
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow_page(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дозаполняет ленту, отписка очищает её."""
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=self.old_post
+            ).exists()
+        )
+        self.assertEqual(self.follow_page(), [self.old_post])
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.follow_page(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков при записи."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=post
+            ).exists()
+        )
+        self.assertEqual(self.follow_page(), [post, self.old_post])
+
+    def test_pull_author_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch.object(timeline, 'FANOUT_LIMIT', 1):
+            post = Post.objects.create(author=self.author, text='Новый пост')
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=post).exists()
+            )
+            self.assertEqual(self.follow_page(), [post, self.old_post])
+
+    def test_pull_posts_kept_after_leaving_pull(self):
+        """Посты, подмешанные при чтении, остаются после выхода из него."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        with mock.patch.object(timeline, 'FANOUT_LIMIT', 2):
+            post = Post.objects.create(author=self.author, text='Новый пост')
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=post).exists()
+            )
+            Follow.objects.get(user=other).delete()
+            cache.clear()
+            self.assertEqual(self.follow_page(), [post, self.old_post])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=other).exists()
+        )
@@ -1,3 +1,5 @@
+import base64
+import json
 import shutil
 import tempfile
 from django.conf import settings
@@ -6,8 +8,9 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from .. import thumbnails
 from ..forms import PostForm
-from ..models import Post, Group
+from ..models import Comment, Post, Group
 from datetime import datetime
 from http import HTTPStatus
 
@@ -50,6 +53,7 @@ class TaskViewTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -161,6 +165,77 @@ class TaskViewTests(TestCase):
                 first_object = response.context['page_obj'][0]
             self.assertEqual(first_object.image, post2.image)
 
+    def test_feed_thumbnails_resolved_in_one_lookup(self):
+        """Миниатюры страницы ленты находятся одним запросом."""
+        posts = []
+        for number in range(3):
+            posts.append(Post.objects.create(
+                author=self.user,
+                text=f'Пост с картинкой {number}',
+                image=SimpleUploadedFile(
+                    name=f'feed{number}.gif',
+                    content=(
+                        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                        b'\x0A\x00\x3B'
+                    ),
+                    content_type='image/gif'
+                )
+            ))
+        # Первый проход создаёт миниатюры, второй только читает их.
+        thumbnails.attach(posts)
+        expected = [post.thumbnail.url for post in posts]
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.attach(posts)
+        self.assertEqual([post.thumbnail.url for post in posts], expected)
+        with self.assertNumQueries(0):
+            thumbnails.attach(posts)
+        response = self.guest_client.get(reverse('posts:main_page'))
+        for post in posts:
+            self.assertContains(response, post.thumbnail_srcset)
+        self.assertContains(response, 'loading="eager"', count=1)
+        self.assertContains(response, 'loading="lazy"', count=2)
+
+    def test_comments_paginated_with_fragment(self):
+        """Комментарии отдаются порциями, авторы одним запросом."""
+        comments_per_page = settings.COMMENTS_PER_PAGE
+        Comment.objects.bulk_create(
+            Comment(
+                post=self.post,
+                author=(self.user, self.user2)[number % 2],
+                text=f'Комментарий {number}',
+            )
+            for number in range(comments_per_page + 5)
+        )
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), comments_per_page)
+        self.assertTrue(comments.has_next)
+        url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id}
+        )
+        self.assertContains(
+            response, f'{url}?after={comments.paginator.next_cursor}'
+        )
+        # Пост и порция комментариев вместе с авторами.
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(
+                url, {'after': comments.paginator.next_cursor}
+            )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {number}' for number in range(
+                comments_per_page, comments_per_page + 5
+            )]
+        )
+        self.assertNotContains(response, 'data-more-comments')
+
     def test_post_detail_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
         response = self.authorized_client.get(
@@ -218,6 +293,79 @@ class TaskViewTests(TestCase):
                         len(response.context['page_obj']), item1[1]
                     )
 
+    def test_cursor_pagination(self):
+        """Курсоры after/before листают ленту без номеров страниц."""
+        Post.objects.bulk_create(
+            [
+                Post(
+                    author=self.user,
+                    text=f'Тестовый пост {pk}',
+                    group=self.group,
+                ) for pk in range(POST_COUNT)
+            ]
+        )
+        templates_pages_names = (
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in templates_pages_names:
+            with self.subTest(reverse_name=url):
+                cache.clear()
+                first_page = self.authorized_client.get(url).context[
+                    'page_obj'
+                ]
+                self.assertTrue(first_page.has_next())
+                self.assertFalse(first_page.has_previous())
+                cache.clear()
+                response = self.authorized_client.get(
+                    url, {'after': first_page.paginator.next_cursor}
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), POST_ON_SECOND_PAGE)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                self.assertNotIn(second_page[0], list(first_page))
+                cache.clear()
+                response = self.authorized_client.get(
+                    url, {'before': second_page.paginator.previous_cursor}
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first_page)
+                )
+
+    def test_malformed_pagination(self):
+        """Подделанные курсоры и огромные номера страниц не ломают ленту."""
+        cursors = [
+            base64.urlsafe_b64encode(raw).decode()
+            for raw in (b'[1,2]', b'[[],{}]', b'["2022-01-01T00:00:00",1e999]')
+        ] + [
+            base64.urlsafe_b64encode(json.dumps(
+                [self.post.pub_date.isoformat(), 10 ** 20]
+            ).encode()).decode(),
+            'не курсор',
+        ]
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.guest_client.get(url, {'after': cursor})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    response = self.guest_client.get(url, {'before': cursor})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+            with self.subTest(url=url, page='huge'):
+                response = self.guest_client.get(url, {'page': 10 ** 20})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        cache.clear()
+        response = self.guest_client.get(
+            reverse('posts:main_page'), {'page': 10 ** 20}
+        )
+        self.assertEqual(len(response.context['page_obj']), 0)
+
     def test_for_post_creation(self):
         post_ex = Post.objects.create(
             author=self.user,
@@ -254,12 +402,154 @@ class TaskViewTests(TestCase):
             post_ex.group
         )
 
+    def test_shared_page_cache_with_user_fragments(self):
+        """Гости и пользователи читают одну копию страницы."""
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        guest_response = self.guest_client.get(url)
+        self.assertContains(guest_response, 'Войти')
+        with self.assertTemplateNotUsed('posts/profile.html'):
+            response = self.authorized_client2.get(url)
+        self.assertContains(response, 'Пользователь: auth2')
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Войти')
+        self.authorized_client2.get(
+            reverse('posts:profile_follow', kwargs={'username': 'auth'})
+        )
+        response = self.authorized_client2.get(url)
+        self.assertContains(response, 'Отписаться')
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Отписаться')
+
+    def test_conditional_get(self):
+        """Неизменившаяся страница отдаётся ответом 304."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Новый комментарий'}
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_get_after_login(self):
+        """Новый секрет CSRF после входа меняет ETag страницы с формой."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        # Первый ответ выдаёт cookie с секретом, он входит в ETag.
+        self.authorized_client.get(url)
+        csrf_cookie = settings.CSRF_COOKIE_NAME
+        self.assertIn(csrf_cookie, self.authorized_client.cookies)
+        etag = self.authorized_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        # Вход заново выдаёт браузеру другой секрет.
+        self.authorized_client.logout()
+        self.authorized_client.force_login(self.user)
+        self.authorized_client.cookies[csrf_cookie] = 'x' * 32
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_conditional_get_after_follow(self):
+        """Подписка меняет кнопку на странице и её ETag."""
+        url = reverse('posts:main_page')
+        etag = self.authorized_client2.get(url)['ETag']
+        self.assertEqual(
+            self.authorized_client2.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+        self.authorized_client2.get(
+            reverse('posts:profile_follow', kwargs={'username': 'auth'})
+        )
+        response = self.authorized_client2.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Отписаться')
+        # Страница гостя от чужой подписки не меняется.
+        etag = self.guest_client.get(url)['ETag']
+        self.authorized_client2.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'auth'})
+        )
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+
     def test_cash(self):
         """Проверка кэша страницы index"""
         response_1 = self.authorized_client.get(reverse("posts:main_page"))
-        Post.objects.get(id=self.post.id).delete()
+        # Изменение в обход моделей не сбрасывает кэш
+        Post.objects.filter(id=self.post.id).update(text='Новый текст')
         response_2 = self.authorized_client.get(reverse("posts:main_page"))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse("posts:main_page"))
         self.assertNotEqual(response_1.content, response_3.content)
+
+    def test_cache_invalidated_by_tags(self):
+        """Изменение поста сбрасывает только зависящие от него страницы."""
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        other_group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group2.slug}
+        )
+        other_group_page = self.guest_client.get(other_group_url).content
+        cached = [self.guest_client.get(url).content for url in urls]
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Тестовый пост изменён'
+        post.save()
+        for url, content in zip(urls, cached):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotEqual(response.content, content)
+                self.assertContains(response, 'Тестовый пост изменён')
+        self.assertEqual(
+            self.guest_client.get(other_group_url).content, other_group_page
+        )
+
+    def test_cache_invalidated_by_group(self):
+        """Изменение и удаление группы сбрасывают страницы со ссылками."""
+        group = Group.objects.create(title='Старое название', slug='old')
+        Post.objects.create(author=self.user2, text='Пост', group=group)
+        urls = (
+            reverse('posts:main_page'),
+            reverse('posts:profile', kwargs={'username': self.user2.username}),
+        )
+        old_url = reverse('posts:group_list', kwargs={'slug': 'old'})
+        for url in urls:
+            self.assertContains(self.guest_client.get(url), old_url)
+        self.assertContains(self.guest_client.get(old_url), 'Старое название')
+        group = Group.objects.get(pk=group.pk)
+        group.title = 'Новое название'
+        group.slug = 'new'
+        group.save()
+        new_url = reverse('posts:group_list', kwargs={'slug': 'new'})
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, new_url)
+                self.assertNotContains(response, old_url)
+        self.assertEqual(
+            self.guest_client.get(old_url).status_code, HTTPStatus.NOT_FOUND
+        )
+        self.assertContains(self.guest_client.get(new_url), 'Новое название')
+        group.delete()
+        for url in urls:
+            with self.subTest(url=url, deleted=True):
+                self.assertNotContains(self.guest_client.get(url), new_url)
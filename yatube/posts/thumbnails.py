@@ -0,0 +1,242 @@
+"""Заблаговременная генерация миниатюр sorl-thumbnail.
+
+Миниатюры всех размеров из `THUMBNAIL_PRESETS` создаются сразу после
+загрузки картинки в пуле процессов, а не при первом рендеринге
+шаблона. Тег `{% thumbnail %}` затем находит готовую миниатюру в
+хранилище ключей sorl и не открывает оригинал. Для каждого формата из
+`images.VARIANT_FORMATS` создаётся ещё и сжатая копия миниатюры: шаблон
+перечисляет их в `<picture>`, и браузер сам выбирает поддерживаемый.
+
+Ленты не вызывают тег для каждого поста: `attach` находит миниатюры
+всей страницы одним `get_many` к кэшу и одним запросом к таблице
+ключей sorl. Недостающую миниатюру создаёт только один запрос, который
+взял блокировку, а остальные дожидаются его результата.
+"""
+import logging
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+from core import query_budget
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from .images import MIME_TYPES, QUALITY, VARIANT_FORMATS, placeholder
+
+
+logger = logging.getLogger(__name__)
+
+PRESETS = settings.THUMBNAIL_PRESETS
+WORKERS = settings.THUMBNAIL_WORKERS
+LOCK_KEY = 'thumbnail_lock:{}'
+LOCK_TIMEOUT = 30
+LOCK_POLL = 0.05
+
+Thumbnail = namedtuple('Thumbnail', 'url width height')
+
+_executor = None
+
+
+def get_executor(workers=WORKERS):
+    global _executor
+    if _executor is None:
+        # spawn вместо fork: дочерний процесс не наследует соединения
+        # с базой и открытые файлы веб-воркера.
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def generate(name):
+    """Создаёт миниатюры картинки.
+
+    Возвращает (имя, ширину, высоту, заглушку) оригинала.
+    """
+    for geometry, options in PRESETS:
+        for _, variant in format_options(options):
+            get_thumbnail(name, geometry, **variant)
+    with default_storage.open(name) as file, Image.open(file) as image:
+        return (name, *image.size, placeholder(image))
+
+
+def try_generate(name):
+    """`generate`, который не прерывает пачку картинок на битой.
+
+    Возвращает (имя, результат `generate` или None, текст ошибки или
+    None). Исключение передаётся текстом: из процесса пула приходит
+    не всякое.
+    """
+    try:
+        return name, generate(name), None
+    except Exception as error:
+        return name, None, f'{type(error).__name__}: {error}'
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Не удалось создать миниатюры: %s', error)
+
+
+def submit(name):
+    if not WORKERS:
+        # Без пула миниатюры создаются в конце запроса, но это работа
+        # фонового воркера, а не представления.
+        try:
+            with query_budget.exempt():
+                generate(name)
+        except Exception as error:
+            logger.error('Не удалось создать миниатюры: %s', error)
+        return
+    get_executor().submit(generate, name).add_done_callback(_log_failure)
+
+
+def schedule(post):
+    """Ставит картинку поста в очередь после фиксации транзакции."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: submit(name))
+
+
+def format_options(options):
+    """Пары (MIME-тип, опции) для основной миниатюры и её вариантов.
+
+    У основной миниатюры формат оригинала, и её тип не указывается.
+    """
+    return [(None, options)] + [
+        (MIME_TYPES[format_], dict(options, format=format_, quality=QUALITY))
+        for format_ in VARIANT_FORMATS
+    ]
+
+
+def thumbnail_file(name, geometry, options):
+    """Файл миниатюры, который вернул бы `get_thumbnail`, без обращений
+    к хранилищу."""
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    # Те же подстановки опций, что и в ThumbnailBackend.get_thumbnail,
+    # иначе имя файла и ключ не совпадут.
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+
+
+def lookup(files):
+    """Ищет миниатюры в хранилище ключей sorl за один проход.
+
+    Возвращает словарь {ключ файла: ImageFile} только для найденных.
+    """
+    kv_cache = default.kvstore.cache
+    keys = {add_prefix(file.key): file.key for file in files}
+    values = kv_cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        rows = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        # Как и sorl, запоминаем в кэше и отсутствие ключа.
+        kv_cache.set_many(
+            {key: rows.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        values.update(rows)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value and value != EMPTY_VALUE
+    }
+
+
+def generate_once(name, geometry, options, thumbnail):
+    """Создаёт миниатюру, если её не создаёт уже другой запрос."""
+    lock = LOCK_KEY.format(thumbnail.key)
+    # Создание миниатюры разовое и не входит в бюджет запросов страницы.
+    with query_budget.exempt():
+        if cache.add(lock, 1, LOCK_TIMEOUT):
+            try:
+                return get_thumbnail(name, geometry, **options)
+            finally:
+                cache.delete(lock)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while cache.has_key(lock) and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+        # Если владелец блокировки так и не справился, создаём сами.
+        return (
+            default.kvstore.get(thumbnail)
+            or get_thumbnail(name, geometry, **options)
+        )
+
+
+def geometry_size(geometry):
+    return tuple(int(value) for value in geometry.split('x'))
+
+
+def srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in thumbnails
+    )
+
+
+def attach(posts, presets=PRESETS):
+    """Записывает миниатюры в посты с картинками.
+
+    `post.thumbnail` получает самую крупную миниатюру в формате
+    оригинала, `post.thumbnail_srcset` все её ширины, а
+    `post.thumbnail_sources` пары (MIME-тип, srcset) сжатых вариантов.
+    Размеры берутся из геометрии пресета: с `crop` и `upscale` sorl
+    всегда отдаёт ровно их.
+    """
+    posts = [post for post in posts if post.image]
+    wanted = {
+        post.pk: [
+            (mime, geometry, variant,
+             thumbnail_file(post.image.name, geometry, variant))
+            for geometry, options in presets
+            for mime, variant in format_options(options)
+        ]
+        for post in posts
+    }
+    found = lookup(
+        file for files in wanted.values() for *_, file in files
+    )
+    for post in posts:
+        sources = {}
+        for mime, geometry, variant, file in wanted[post.pk]:
+            file = found.get(file.key) or generate_once(
+                post.image.name, geometry, variant, file
+            )
+            sources.setdefault(mime, []).append(
+                Thumbnail(file.url, *geometry_size(geometry))
+            )
+        fallback = sources.pop(None)
+        post.thumbnail = fallback[-1]
+        post.thumbnail_srcset = srcset(fallback)
+        post.thumbnail_sources = [
+            (mime, srcset(files)) for mime, files in sources.items()
+        ]
+    return posts
@@ -0,0 +1,204 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в ленты подписчиков автора, поэтому
+`follow_index` читает одну таблицу `TimelineEntry` вместо соединения
+`Follow` и `Post`. Авторы, у которых подписчиков не меньше
+`TIMELINE_FANOUT_LIMIT`, в ленты не раскладываются: их посты
+подмешиваются при чтении (fan-out on read).
+
+Переход автора через порог вверх не переписывает уже разложенные
+посты. Когда подписчиков снова становится меньше порога, свежие посты
+автора раскладываются в ленты оставшихся подписчиков, иначе посты,
+подмешанные при чтении, пропали бы из них вместе с кэшем
+`pull_author_ids`.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from .models import Follow, Post, TimelineEntry
+
+
+FANOUT_LIMIT = settings.TIMELINE_FANOUT_LIMIT
+BACKFILL_SIZE = settings.TIMELINE_BACKFILL_SIZE
+PULL_AUTHORS_TTL = settings.TIMELINE_PULL_AUTHORS_TTL
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+ORDERING = ('-feed_date', '-feed_post')
+# SQLite в Django 2.2 вставляет пачку одним составным SELECT,
+# а в нём не больше 500 частей.
+BATCH_SIZE = 500
+
+
+def pull_author_ids():
+    """Авторы, чьи посты подмешиваются в ленту при чтении."""
+    author_ids = cache.get(PULL_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = frozenset(
+            Follow.objects.values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gte=FANOUT_LIMIT
+            ).values_list('author', flat=True)
+        )
+        cache.set(PULL_AUTHORS_KEY, author_ids, PULL_AUTHORS_TTL)
+    return author_ids
+
+
+def is_pull_author(author_id):
+    # Срез ограничивает просмотр индекса порогом, а не числом подписчиков.
+    if not Follow.objects.filter(
+        author_id=author_id
+    )[FANOUT_LIMIT - 1:].exists():
+        return False
+    author_ids = pull_author_ids()
+    if author_id not in author_ids:
+        cache.set(
+            PULL_AUTHORS_KEY, author_ids | {author_id}, PULL_AUTHORS_TTL
+        )
+    return True
+
+
+def fan_out(post):
+    """Добавляет пост в ленты всех подписчиков автора."""
+    if is_pull_author(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.id,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            ) for user_id in follower_ids.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(follow):
+    """Заполняет ленту свежими постами автора после подписки."""
+    if follow.author_id in pull_author_ids():
+        return
+    posts = Post.objects.filter(
+        author_id=follow.author_id
+    ).values_list('id', 'pub_date')[:BACKFILL_SIZE]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follow.user_id,
+                post_id=post_id,
+                author_id=follow.author_id,
+                pub_date=pub_date,
+            ) for post_id, pub_date in posts
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def leave_pull(follow):
+    """Раскладывает свежие посты автора, который после отписки
+    перестал подмешиваться при чтении.
+
+    Подписчиков ровно на одного меньше порога бывает только сразу после
+    перехода через него. Все пары подписчик — пост вставляются одним
+    INSERT ... SELECT, уже разложенные пропускаются.
+    """
+    author_id = follow.author_id
+    followers = Follow.objects.filter(author_id=author_id)
+    if len(followers.values_list('id', flat=True)[:FANOUT_LIMIT]) != (
+        FANOUT_LIMIT - 1
+    ):
+        return
+    cache.set(
+        PULL_AUTHORS_KEY, pull_author_ids() - {author_id}, PULL_AUTHORS_TTL
+    )
+    operations = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{operations.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow JOIN ('
+            f' SELECT id, author_id, pub_date FROM {Post._meta.db_table}'
+            ' WHERE author_id = %s ORDER BY pub_date DESC LIMIT %s'
+            ') post ON post.author_id = follow.author_id '
+            'WHERE follow.author_id = %s '
+            f'{operations.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [author_id, BACKFILL_SIZE, author_id],
+        )
+
+
+def prune(follow):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id,
+        author_id=follow.author_id,
+    ).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты заново.
+
+    Нужна после массовой загрузки в обход сигналов. Каждый читатель
+    получает последние `BACKFILL_SIZE` постов каждого автора, на
+    которого подписан, как после `backfill`. Вместо запроса на каждую
+    подписку выполняется один INSERT ... SELECT с оконной функцией.
+    """
+    pull_ids = list(pull_author_ids())
+    exclude = (
+        'AND follow.author_id NOT IN (%s)' % ', '.join(['%s'] * len(pull_ids))
+        if pull_ids else ''
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.all().delete()
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT DISTINCT follow.user_id, post.id, post.author_id, '
+            'post.pub_date '
+            f'FROM {Follow._meta.db_table} follow JOIN ('
+            ' SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            '  PARTITION BY author_id ORDER BY pub_date DESC'
+            ' ) AS position'
+            f' FROM {Post._meta.db_table}'
+            ') post ON post.author_id = follow.author_id '
+            f'WHERE post.position <= %s {exclude} '
+            'ORDER BY follow.user_id, post.pub_date',
+            [BACKFILL_SIZE, *pull_ids],
+        )
+        return cursor.rowcount
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя.
+
+    Сортировать их нужно по `ORDERING`. Без подмешиваемых авторов это
+    столбцы записи ленты, и страницу читает индекс
+    (user, -pub_date, -post) без сортировки. Посты подмешиваемых
+    авторов записей ленты не имеют, поэтому тогда сортируются столбцы
+    самого поста с теми же значениями.
+    """
+    pull_ids = list(
+        Follow.objects.filter(
+            user=user,
+            author_id__in=pull_author_ids(),
+        ).values_list('author_id', flat=True)
+    )
+    if not pull_ids:
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post_id'),
+        )
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(
+            user=user
+        ).values('post_id'))
+        | Q(author_id__in=pull_ids)
+    ).annotate(feed_date=F('pub_date'), feed_post=F('id'))
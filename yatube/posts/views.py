@@ -1,26 +1,57 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from core.page_cache import cache_page_tagged
+from core.query_budget import query_budget
+from core.replicas import replica_reads
+from .cache_tags import group_tags, index_tags, post_detail_tags, profile_tags
+from .counters import profile_of
 from .models import Post, Group, Follow
 from .forms import PostForm, CommentForm
+from .paginators import CursorPaginator
+from . import duplicates, related, search, thumbnails
+from .timeline import ORDERING as TIMELINE_ORDERING, timeline_posts
 
 
 User = get_user_model()
 
 
 POST_PER_PAGE = settings.POST_PER_PAGE
+COMMENTS_PER_PAGE = settings.COMMENTS_PER_PAGE
+PAGE_CACHE_TIMEOUT = settings.PAGE_CACHE_TIMEOUT
+# Бюджеты @query_budget посчитаны для авторизованного пользователя
+# при промахе кэша страниц и с картинками в постах.
 
 
-def paginatorer(request, query_set):
-    paginator = Paginator(query_set, POST_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def paginatorer(request, query_set, count=None,
+                ordering=CursorPaginator.ORDERING):
+    paginator = CursorPaginator(
+        query_set, POST_PER_PAGE, ordering=ordering, count=count
+    )
+    page_obj = paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    thumbnails.attach(page_obj)
+    return page_obj
+
+
+def comments_page(post, after=None):
+    # Авторы приходят тем же запросом, что и комментарии.
+    paginator = CursorPaginator(
+        post.comments.select_related('author').order_by('created', 'id'),
+        COMMENTS_PER_PAGE,
+        ordering=('created', 'id'),
+    )
+    return paginator.get_page(after=after)
 
 
-@cache_page(20, key_prefix='index_page')
+@query_budget(4)
+@replica_reads
+@cache_page_tagged(PAGE_CACHE_TIMEOUT, 'index_page', index_tags)
 def index(request):
     posts = (
         Post.objects.select_related('author', 'group')
@@ -29,12 +60,15 @@ def index(request):
     return render(request, 'posts/index.html', {'page_obj': page_obj, })
 
 
+@query_budget(5)
+@replica_reads
+@cache_page_tagged(PAGE_CACHE_TIMEOUT, 'group_page', group_tags)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = (
         group.posts.select_related('author')
     )
-    page_obj = paginatorer(request, posts)
+    page_obj = paginatorer(request, posts, count=group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -42,80 +76,128 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(5)
+@replica_reads
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        number = min(
+            max(int(request.GET.get('page', 1)), 1), CursorPaginator.MAX_PAGE
+        )
+    except ValueError:
+        number = 1
+    posts, has_next = search.search_posts(query, POST_PER_PAGE, number)
+    thumbnails.attach(posts)
+    context = {
+        'query': query,
+        'posts': posts,
+        'number': number,
+        'has_next': has_next,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(6)
+@replica_reads
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginatorer(request, posts)
+    posts = timeline_posts(request.user).select_related('author', 'group')
+    page_obj = paginatorer(request, posts, ordering=TIMELINE_ORDERING)
     return render(request, 'posts/follow.html', {'page_obj': page_obj, })
 
 
+@query_budget(11)
 @login_required
 def profile_follow(request, username):
     # Подписаться на автора
     following_author = get_object_or_404(User, username=username)
     if (request.user != following_author):
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=following_author,
-        )
+        with transaction.atomic():
+            Follow.objects.get_or_create(
+                user=request.user,
+                author=following_author,
+            )
     return redirect('posts:profile', username=username)
 
 
+@query_budget(10)
 @login_required
 def profile_unfollow(request, username):
     # Дизлайк, отписка
     following_author = get_object_or_404(User, username=username)
     if (request.user != following_author):
+        # QuerySet.delete() отбрасывает select_related, а сигналу
+        # удаления нужны имена обоих пользователей.
         follow = Follow.objects.filter(
             user=request.user,
             author=following_author
-        )
-        if follow.exists():
-            follow.delete()
+        ).select_related('user', 'author').first()
+        if follow is not None:
+            with transaction.atomic():
+                follow.delete()
     return redirect('posts:profile', username=username)
 
 
+@query_budget(6)
+@replica_reads
+@cache_page_tagged(PAGE_CACHE_TIMEOUT, 'profile_page', profile_tags)
 def profile(request, username):
-    following_author = get_object_or_404(User, username=username)
+    following_author = get_object_or_404(
+        User.objects.select_related('profile'),
+        username=username
+    )
     posts = (
         following_author.posts.select_related('author', 'group')
     )
-    page_obj = paginatorer(request, posts)
-
-    following = (
-        request.user.is_authenticated and (
-            request.user != following_author
-        ) and Follow.objects.filter(
-            user=request.user,
-            author=following_author
-        ).exists()
-    )
-    button_visible = request.user.is_authenticated and (
-        request.user != following_author
+    page_obj = paginatorer(
+        request, posts, count=profile_of(following_author).posts_count
     )
+    # Кнопка подписки зависит от читателя и подставляется фрагментом.
     context = {
         'page_obj': page_obj,
         'author': following_author,
-        'following': following,
-        'button_visible': button_visible
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(7)
+@replica_reads
+@cache_page_tagged(PAGE_CACHE_TIMEOUT, 'post_page', post_detail_tags)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
-    can_edit = request.user == post.author
-    form = CommentForm()
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        id=post_id
+    )
+    thumbnails.attach([post])
+    profile_of(post.author)
+    comments = comments_page(post)
+    # Ссылка на редактирование и форма комментария подставляются
+    # фрагментами, общее тело страницы от читателя не зависит.
     context = {
         'post': post,
-        'can_edit': can_edit,
+        'can_edit': request.user == post.author,
         'comments': comments,
-        'form': form,
+        'related_posts': post.related_posts.select_related(
+            'related__author'
+        ).order_by('-score'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(5)
+@replica_reads
+@cache_page_tagged(PAGE_CACHE_TIMEOUT, 'comments_page', post_detail_tags)
+def post_comments(request, post_id):
+    # Следующая порция комментариев в виде HTML-фрагмента.
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(post, after=request.GET.get('after')),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+@query_budget(16)
 @login_required
 def post_create(request):
     is_edit = False
@@ -123,10 +205,17 @@ def post_create(request):
         request.POST or None,
         files=request.FILES or None,
     )
-    if form.is_valid():
+    check = form.is_valid() and duplicates.check_form(
+        form, duplicates.POST, request.user
+    )
+    if check:
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            thumbnails.schedule(post)
+            related.schedule(post)
+            check.save(request.user, post=post)
         return redirect('posts:profile', username=post.author.username)
     return render(
         request, 'posts/post_create.html',
@@ -134,6 +223,7 @@ def post_create(request):
     )
 
 
+@query_budget(18)
 @login_required
 def post_edit(request, post_id):
     is_edit = True
@@ -145,9 +235,20 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post
     )
-    if form.is_valid():
+    check = form.is_valid() and (
+        'text' not in form.changed_data or duplicates.check_form(
+            form, duplicates.POST, request.user, exclude={'post': post}
+        )
+    )
+    if check:
         post = form.save(commit=False)
-        post.save()
+        with transaction.atomic():
+            post.save()
+            if 'image' in form.changed_data:
+                thumbnails.schedule(post)
+            if 'text' in form.changed_data:
+                related.schedule(post)
+                check.replace(post)
         return redirect('posts:post_detail', post_id=post_id)
     return render(
         request, 'posts/post_create.html',
@@ -155,13 +256,21 @@ def post_edit(request, post_id):
     )
 
 
+@query_budget(8)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    # Почти повтор своего комментария отбрасывается, как и неверная
+    # форма.
+    check = form.is_valid() and duplicates.check_form(
+        form, duplicates.COMMENT, request.user
+    )
+    if check:
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            check.save(request.user, comment=comment)
     return redirect("posts:post_detail", post_id=post_id)
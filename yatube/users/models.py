@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        'Постов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Подписок',
+        default=0
+    )
+
+    def __str__(self):
+        return f'Профиль {self.user_id}'
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +27,8 @@ SECRET_KEY = 'px+-=y+r_4kt0$qr56j118w3m%i(&!j1u)j1^!s_h&#kv8*!1w'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 ALLOWED_HOSTS = [
@@ -62,6 +66,7 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MIDDLEWARE = [
+    'core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -76,12 +82,55 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Счётчик запросов работает при разработке и в тестах. В тестах
+# превышение бюджета представления или QUERY_BUDGET_REPEATS одинаковых
+# запросов за ответ (N+1) роняет тест, при разработке пишется в лог.
+QUERY_BUDGET_ENABLED = DEBUG or TESTING
+QUERY_BUDGET_STRICT = TESTING
+QUERY_BUDGET_REPEATS = 3
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 POST_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Лента подписок: авторы с числом подписчиков от TIMELINE_FANOUT_LIMIT
+# не раскладываются по лентам, а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL_SIZE = 100
+TIMELINE_PULL_AUTHORS_TTL = 60 * 10
+
+# Рекомендации авторов: хранимых на пользователя, показываемых и
+# похожих авторов, учитываемых у каждого автора.
+AUTHOR_SUGGESTIONS_SIZE = 20
+AUTHOR_SUGGESTIONS_SHOWN = 5
+AUTHOR_SUGGESTIONS_NEIGHBOURS = 20
+# Похожих постов на странице поста.
+RELATED_POSTS_SIZE = 5
 ROOT_URLCONF = 'yatube.urls'
 
+# Миниатюры, которые шаблоны запрашивают у sorl-thumbnail: ширины одного
+# кадрирования для srcset, от меньшей к большей. Они создаются при
+# загрузке картинки в пуле из THUMBNAIL_WORKERS процессов; 0 означает
+# генерацию в том же процессе.
+THUMBNAIL_PRESETS = (
+    ('360x127', {'crop': 'center', 'upscale': True}),
+    ('720x254', {'crop': 'center', 'upscale': True}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+
+# Загруженные картинки уменьшаются до IMAGE_MAX_SIZE пикселей по длинной
+# стороне. Для форматов из IMAGE_VARIANT_FORMATS, которые поддерживает
+# Pillow, для каждой миниатюры создаются сжатые варианты; AVIF требует
+# пакета pillow-avif-plugin.
+IMAGE_MAX_SIZE = 2048
+IMAGE_QUALITY = 80
+IMAGE_VARIANT_FORMATS = ('AVIF', 'WEBP')
+# Ширина размытой заглушки, которая видна, пока картинка не загрузилась.
+IMAGE_PLACEHOLDER_WIDTH = 24
+
 # Путь к директории с шаблонами вынесен в переменную:
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
@@ -112,9 +161,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение и его PRAGMA переживают запрос.
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Применяются к каждому новому соединению SQLite (core.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 2 ** 20,
+    'cache_size': -64 * 2 ** 10,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Реплики для чтения (core.replicas): пути к копиям основной базы через
+# os.pathsep. Соединение с репликой запрещает запись.
+for number, path in enumerate(filter(None, os.environ.get(
+    'YATUBE_DATABASE_REPLICAS', ''
+).split(os.pathsep)), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'PRAGMAS': {'query_only': 'ON'},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Наибольшее отставание реплик в секундах: столько после записи браузер
+# читает из основной базы, и столько живут страницы из реплики в кэше.
+REPLICA_MAX_LAG = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -155,8 +233,25 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+# Страницы сбрасываются тегами при изменении данных,
+# поэтому TTL может быть долгим.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Кэш в SQLite-файле общий для всех воркеров сервера. Тесты получают
+# свой файл, чтобы не видеть страниц, закэшированных прошлым запуском.
+CACHE_LOCATION = os.environ.get(
+    'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+)
+if TESTING:
+    CACHE_LOCATION = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }